@@ -0,0 +1,86 @@
+cimport cython
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef inline Py_ssize_t _bisect_left(list masses, double mass, Py_ssize_t lo, Py_ssize_t hi):
+    cdef:
+        Py_ssize_t mid
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if <double>masses[mid] < mass:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef inline Py_ssize_t _bisect_right(list masses, double mass, Py_ssize_t lo, Py_ssize_t hi):
+    cdef:
+        Py_ssize_t mid
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if mass < <double>masses[mid]:
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cpdef tuple bisect_with_flag(list masses, double mass, double error_tolerance=1e-5):
+    cdef:
+        double width
+        Py_ssize_t low_end, high_end, n
+    n = len(masses)
+    width = mass * error_tolerance
+    low_end = _bisect_left(masses, mass - width, 0, n)
+    high_end = _bisect_right(masses, mass + width, low_end, n)
+    if low_end < high_end:
+        return range(low_end, high_end), True
+    return [max(low_end - 1, 0)], False
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cpdef object argmin_mass_error(list masses, object indices, double mass):
+    cdef:
+        Py_ssize_t best_index, i
+        double best_error, err
+    best_index = -1
+    best_error = float('inf')
+    for i in indices:
+        err = abs(<double>masses[i] - mass) / mass
+        if err < best_error:
+            best_index = i
+            best_error = err
+    if best_index < 0:
+        return None
+    return best_index
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cpdef tuple search_mass_array(double[::1] masses, double mass, double error_tolerance=1e-5):
+    cdef:
+        Py_ssize_t n, lo, hi, mid, index
+    n = masses.shape[0]
+    if n == 0:
+        return 0, False
+    lo = 0
+    hi = n
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if masses[mid] < mass:
+            lo = mid + 1
+        else:
+            hi = mid
+    index = lo
+    if index == n:
+        index = n - 1
+    elif index > 0 and (mass - masses[index - 1]) < (masses[index] - mass):
+        index -= 1
+    return index, abs((masses[index] - mass) / mass) <= error_tolerance
@@ -63,10 +63,13 @@ class SubsequenceMasker(object):
         self.masking_nodes = nodes
 
     def mask(self):
+        # Nodes compare equal by their members, which all come from the same scan,
+        # so only masking nodes from a target node's scan need to be compared to it.
+        masking_nodes_by_scan = group_by(self.masking_nodes, attrgetter("scan_id"))
         unmasked_nodes = []
         target_nodes = self.target.nodes.unspool_strip_children()
         for node in target_nodes:
-            if node not in self.masking_nodes:
+            if node not in masking_nodes_by_scan.get(node.scan_id, ()):
                 unmasked_nodes.append(node)
 
         new = self.target.clone()
@@ -560,7 +563,7 @@ class ChromatogramTreeList(object):
         lo = 0
         hi = len(self.roots)
         while lo != hi:
-            i = (lo + hi) / 2
+            i = (lo + hi) // 2
             node = self.roots[i]
             if node.retention_time == retention_time:
                 return node, i
@@ -578,10 +581,13 @@ class ChromatogramTreeList(object):
         self._node_id_hash = frozenset(node_id_hash)
 
     def _build_peak_hash(self):
-        peak_hash = set()
+        peak_hash = {}
         for node in self.unspool():
-            peak_hash.update([(node.scan_id, peak) for peak in node.members])
-        self._peak_hash = frozenset(peak_hash)
+            try:
+                peak_hash[node.scan_id].update(node.members)
+            except KeyError:
+                peak_hash[node.scan_id] = set(node.members)
+        self._peak_hash = peak_hash
 
     @property
     def node_id_hash(self):
@@ -670,7 +676,15 @@ class ChromatogramTreeList(object):
         return not self.node_id_hash.isdisjoint(other.node_id_hash)
 
     def common_peaks(self, other):
-        return not self.peak_hash.isdisjoint(other.peak_hash)
+        peak_hash = self.peak_hash
+        other_peak_hash = other.peak_hash
+        if len(other_peak_hash) < len(peak_hash):
+            peak_hash, other_peak_hash = other_peak_hash, peak_hash
+        for scan_id, peaks in peak_hash.items():
+            other_peaks = other_peak_hash.get(scan_id)
+            if other_peaks is not None and not peaks.isdisjoint(other_peaks):
+                return True
+        return False
 
     def __repr__(self):
         return "ChromatogramTreeList(%d nodes, %0.2f-%0.2f)" % (
@@ -40,7 +40,8 @@ class ChromatogramDeltaNode(object):
 
 
 def build_chromatogram_nodes(rt, signal, sigma=3):
-    rt = np.array(rt)
+    rt = np.ascontiguousarray(rt, dtype=np.float64)
+    signal = np.ascontiguousarray(signal, dtype=np.float64)
     smoothed = gaussian_filter1d(signal, sigma)
     delta_smoothed = np.gradient(smoothed, rt)
     change = delta_smoothed[:-1] - delta_smoothed[1:]
@@ -94,9 +95,10 @@ class SimpleChromatogram(OrderedDict):
     glycan_composition = None
 
     def as_arrays(self):
+        n = len(self)
         return (
-            np.array(map(self.time_converter.scan_id_to_rt, self)),
-            np.array(self.values()))
+            np.fromiter(map(self.time_converter.scan_id_to_rt, self), dtype=np.float64, count=n),
+            np.fromiter(self.values(), dtype=np.float64, count=n))
 
     def get_chromatogram(self):
         return self
@@ -1,3 +1,6 @@
+from bisect import bisect_left, bisect_right
+from operator import attrgetter, itemgetter
+
 from ms_deisotope.peak_dependency_network.intervals import Interval, IntervalTreeNode
 
 from glycan_profiling.task import TaskBase
@@ -5,6 +8,10 @@ from glycan_profiling.task import TaskBase
 from .chromatogram import Chromatogram
 
 
+neutral_mass_getter = attrgetter("neutral_mass")
+total_signal_getter = attrgetter("total_signal")
+
+
 class ChromatogramForest(TaskBase):
     """An an algorithm for aggregating chromatograms from peaks of close mass
     weighted by intensity.
@@ -37,10 +44,12 @@ class ChromatogramForest(TaskBase):
     def __init__(self, chromatograms=None, error_tolerance=1e-5, scan_id_to_rt=lambda x: x):
         if chromatograms is None:
             chromatograms = []
-        self.chromatograms = sorted(chromatograms, key=lambda x: x.neutral_mass)
+        self.chromatograms = sorted(chromatograms, key=neutral_mass_getter)
+        self._masses = [c.neutral_mass for c in self.chromatograms]
         self.error_tolerance = error_tolerance
         self.scan_id_to_rt = scan_id_to_rt
         self.count = 0
+        self._rt_cache = {}
 
     def __len__(self):
         return len(self.chromatograms)
@@ -55,72 +64,100 @@ class ChromatogramForest(TaskBase):
             return [self.chromatograms[j] for j in i]
 
     def find_insertion_point(self, peak):
-        index, matched = binary_search_with_flag(
-            self.chromatograms, peak.neutral_mass, self.error_tolerance)
+        index, matched = bisect_with_flag(
+            self._masses, peak.neutral_mass, self.error_tolerance)
         return index, matched
 
     def find_minimizing_index(self, peak, indices):
-        best_index = None
-        best_error = float('inf')
-        for index_case in indices:
-            chroma = self[index_case]
-            err = abs(chroma.neutral_mass - peak.neutral_mass) / peak.neutral_mass
-            if err < best_error:
-                best_index = index_case
-                best_error = err
-        return best_index
+        return argmin_mass_error(self._masses, indices, peak.neutral_mass)
 
     def handle_peak(self, scan_id, peak):
-        if len(self) == 0:
-            index = [0]
-            matched = False
-        else:
-            index, matched = self.find_insertion_point(peak)
+        retention_time = self._rt_cache.get(scan_id)
+        if retention_time is None:
+            retention_time = self._rt_cache[scan_id] = self.scan_id_to_rt(scan_id)
+        index, matched = self.find_insertion_point(peak)
         if matched:
-            chroma = self.chromatograms[self.find_minimizing_index(peak, index)]
+            best_index = self.find_minimizing_index(peak, index)
+            chroma = self.chromatograms[best_index]
             most_abundant_member = chroma.most_abundant_member
-            chroma.insert(scan_id, peak, self.scan_id_to_rt(scan_id))
+            chroma.insert(scan_id, peak, retention_time)
             if peak.intensity < most_abundant_member:
                 chroma.retain_most_abundant_member()
+            self._masses[best_index] = chroma.neutral_mass
         else:
             chroma = Chromatogram(None)
             chroma.created_at = "forest"
-            chroma.insert(scan_id, peak, self.scan_id_to_rt(scan_id))
-            self.insert_chromatogram(chroma, index)
+            chroma.insert(scan_id, peak, retention_time)
+            self.insert_chromatogram(chroma)
         self.count += 1
 
-    def insert_chromatogram(self, chromatogram, index):
-        if index[0] != 0:
-            self.chromatograms.insert(index[0] + 1, chromatogram)
-        else:
-            if len(self) == 0:
-                new_index = index[0]
-            else:
-                x = self.chromatograms[index[0]]
-                if x.neutral_mass < chromatogram.neutral_mass:
-                    new_index = index[0] + 1
-                else:
-                    new_index = index[0]
-            self.chromatograms.insert(new_index, chromatogram)
+    def insert_chromatogram(self, chromatogram):
+        mass = chromatogram.neutral_mass
+        index = bisect_left(self._masses, mass)
+        self._masses.insert(index, mass)
+        self.chromatograms.insert(index, chromatogram)
 
     def aggregate_unmatched_peaks(self, *args, **kwargs):
         import warnings
         warnings.warn("Instead of calling aggregate_unmatched_peaks, call aggregate_peaks", stacklevel=2)
         self.aggregate_peaks(*args, **kwargs)
 
+    def _partition_by_mass(self, ranked_peaks):
+        """Split `ranked_peaks`, sorted by neutral mass, into runs which are
+        separated by a mass gap wider than :attr:`error_tolerance`.
+
+        No peak in one run can fall within :attr:`error_tolerance` of a peak
+        in any other run, so each run can be aggregated independently.
+        """
+        error_tolerance = self.error_tolerance
+        block = []
+        last_mass = None
+        for item in ranked_peaks:
+            mass = item[2].neutral_mass
+            if last_mass is not None and (last_mass + last_mass * error_tolerance) < (
+                    mass - mass * error_tolerance):
+                yield block
+                block = []
+            block.append(item)
+            last_mass = mass
+        if block:
+            yield block
+
     def aggregate_peaks(self, scan_id_peaks_list, minimum_mass=300, minimum_intensity=1000.):
         unmatched = sorted(scan_id_peaks_list, key=lambda x: x[1].intensity, reverse=True)
-        for scan_id, peak in unmatched:
-            if peak.neutral_mass < minimum_mass or peak.intensity < minimum_intensity:
-                continue
-            self.handle_peak(scan_id, peak)
+        unmatched = [
+            (rank, scan_id, peak) for rank, (scan_id, peak) in enumerate(unmatched)
+            if not (peak.neutral_mass < minimum_mass or peak.intensity < minimum_intensity)
+        ]
+        if self.chromatograms:
+            for _, scan_id, peak in unmatched:
+                self.handle_peak(scan_id, peak)
+            return
+        # Peaks are only ever grouped with chromatograms within `error_tolerance` of
+        # them, so runs of peaks separated by a wider mass gap never interact. Aggregate
+        # each run in intensity order against its own short list and concatenate the
+        # results, which are already in mass order, instead of growing one long list.
+        unmatched.sort(key=lambda x: x[2].neutral_mass)
+        chromatograms = []
+        masses = []
+        for block in self._partition_by_mass(unmatched):
+            self.chromatograms = []
+            self._masses = []
+            block.sort(key=itemgetter(0))
+            for _, scan_id, peak in block:
+                self.handle_peak(scan_id, peak)
+            chromatograms.extend(self.chromatograms)
+            masses.extend(self._masses)
+        self.chromatograms = chromatograms
+        self._masses = masses
 
 
 class ChromatogramMerger(TaskBase):
     def __init__(self, chromatograms=None, error_tolerance=1e-5):
         if chromatograms is None:
             chromatograms = []
-        self.chromatograms = sorted(chromatograms, key=lambda x: x.neutral_mass)
+        self.chromatograms = sorted(chromatograms, key=neutral_mass_getter)
+        self._masses = [c.neutral_mass for c in self.chromatograms]
         self.error_tolerance = error_tolerance
         self.count = 0
         self.verbose = False
@@ -138,60 +175,54 @@ class ChromatogramMerger(TaskBase):
             return [self.chromatograms[j] for j in i]
 
     def find_candidates(self, new_chromatogram):
-        index, matched = binary_search_with_flag(
-            self.chromatograms, new_chromatogram.neutral_mass, self.error_tolerance)
+        index, matched = bisect_with_flag(
+            self._masses, new_chromatogram.neutral_mass, self.error_tolerance)
         return index, matched
 
-    def merge_overlaps(self, new_chromatogram, chromatogram_range):
+    def merge_overlaps(self, new_chromatogram, indices):
         has_merged = False
         query_mass = new_chromatogram.neutral_mass
-        for chroma in chromatogram_range:
-            cond = (chroma.overlaps_in_time(new_chromatogram) and abs(
-                    (chroma.neutral_mass - query_mass) / query_mass) < self.error_tolerance and
-                    not chroma.common_nodes(new_chromatogram))
-            if cond:
-                chroma.merge(new_chromatogram)
+        masses = self._masses
+        for i in indices:
+            if abs((masses[i] - query_mass) / query_mass) >= self.error_tolerance:
+                continue
+            chroma = self.chromatograms[i]
+            if chroma.overlaps_in_time(new_chromatogram) and not chroma.common_nodes(new_chromatogram):
+                # :meth:`Chromatogram.merge` returns a new instance, and the merged
+                # chromatogram's mass may differ, so re-insert it in sorted order.
+                merged = chroma.merge(new_chromatogram)
+                self.chromatograms.pop(i)
+                masses.pop(i)
+                self.insert_chromatogram(merged)
                 has_merged = True
                 break
         return has_merged
 
-    def find_insertion_point(self, new_chromatogram):
-        return binary_search_exact(
-            self.chromatograms, new_chromatogram.neutral_mass)
-
     def handle_new_chromatogram(self, new_chromatogram):
-        if len(self) == 0:
-            index = [0]
-            matched = False
-        else:
-            index, matched = self.find_candidates(new_chromatogram)
+        index, matched = self.find_candidates(new_chromatogram)
         if matched:
-
-            chroma = self[index]
-            has_merged = self.merge_overlaps(new_chromatogram, chroma)
+            has_merged = self.merge_overlaps(new_chromatogram, index)
             if not has_merged:
-                insertion_point = self.find_insertion_point(new_chromatogram)
-                self.insert_chromatogram(new_chromatogram, [insertion_point])
+                self.insert_chromatogram(new_chromatogram)
         else:
-            self.insert_chromatogram(new_chromatogram, index)
+            self.insert_chromatogram(new_chromatogram)
         self.count += 1
 
-    def insert_chromatogram(self, chromatogram, index):
-        if index[0] != 0:
-            self.chromatograms.insert(index[0] + 1, chromatogram)
-        else:
-            if len(self) == 0:
-                new_index = index[0]
-            else:
-                x = self.chromatograms[index[0]]
-                if x.neutral_mass < chromatogram.neutral_mass:
-                    new_index = index[0] + 1
-                else:
-                    new_index = index[0]
-            self.chromatograms.insert(new_index, chromatogram)
+    def insert_chromatogram(self, chromatogram):
+        mass = chromatogram.neutral_mass
+        index = bisect_left(self._masses, mass)
+        self._masses.insert(index, mass)
+        self.chromatograms.insert(index, chromatogram)
+
+    def reset(self):
+        """Discard all accumulated chromatograms so this instance can be reused
+        """
+        self.chromatograms = []
+        self._masses = []
+        self.count = 0
 
     def aggregate_chromatograms(self, chromatograms):
-        unmatched = sorted(chromatograms, key=lambda x: x.total_signal, reverse=True)
+        unmatched = sorted(chromatograms, key=total_signal_getter, reverse=True)
         for chroma in unmatched:
             self.handle_new_chromatogram(chroma)
 
@@ -210,11 +241,7 @@ def flatten_tree(tree):
         next_left = next_node.left
         if next_left is not None:
             input_queue.append(next_left)
-    return output_queue[::-1]
-
-
-def layered_traversal(nodes):
-    return sorted(nodes, key=lambda x: (x.level, x.center), reverse=True)
+    return output_queue
 
 
 class ChromatogramOverlapSmoother(object):
@@ -222,6 +249,7 @@ class ChromatogramOverlapSmoother(object):
         self.retention_interval_tree = build_rt_interval_tree(chromatograms)
         self.error_tolerance = error_tolerance
         self.solution_map = {None: []}
+        self._merger = ChromatogramMerger(error_tolerance=error_tolerance)
         self.chromatograms = self.smooth()
 
     def __iter__(self):
@@ -237,14 +265,17 @@ class ChromatogramOverlapSmoother(object):
         chromatograms = [interval[0] for interval in tree.contained]
         chromatograms.extend(self.solution_map[tree.left])
         chromatograms.extend(self.solution_map[tree.right])
-        merger = ChromatogramMerger(error_tolerance=self.error_tolerance)
+        merger = self._merger
+        merger.reset()
         merger.aggregate_chromatograms(chromatograms)
         self.solution_map[tree] = list(merger)
         return merger
 
     def smooth(self):
-        nodes = layered_traversal(flatten_tree(self.retention_interval_tree))
-        for node in nodes:
+        # :func:`flatten_tree` visits every node before its children, so walking
+        # its output backwards aggregates each node's children before the node.
+        nodes = flatten_tree(self.retention_interval_tree)
+        for node in reversed(nodes):
             self.aggregate_interval(node)
         final = self.solution_map[self.retention_interval_tree]
         result = ChromatogramMerger()
@@ -252,88 +283,109 @@ class ChromatogramOverlapSmoother(object):
         return list(result)
 
 
-def binary_search_with_flag(array, mass, error_tolerance=1e-5):
-        lo = 0
-        n = hi = len(array)
-        while hi != lo:
-            mid = (hi + lo) // 2
-            x = array[mid]
-            err = (x.neutral_mass - mass) / mass
-            if abs(err) <= error_tolerance:
-                i = mid - 1
-                # Begin Sweep forward
-                while i > 0:
-                    x = array[i]
-                    err = (x.neutral_mass - mass) / mass
-                    if abs(err) <= error_tolerance:
-                        i -= 1
-                        continue
-                    else:
-                        break
-                low_end = i
-                i = mid + 1
-
-                # Begin Sweep backward
-                while i < n:
-                    x = array[i]
-                    err = (x.neutral_mass - mass) / mass
-                    if abs(err) <= error_tolerance:
-                        i += 1
-                        continue
-                    else:
-                        break
-                high_end = i
-                return list(range(low_end, high_end)), True
-            elif (hi - lo) == 1:
-                return [mid], False
-            elif err > 0:
-                hi = mid
-            elif err < 0:
-                lo = mid
-        return 0, False
-
-
-def binary_search_exact(array, mass):
-    lo = 0
-    hi = len(array)
-    while hi != lo:
-        mid = (hi + lo) // 2
-        x = array[mid]
-        err = (x.neutral_mass - mass)
-        if err == 0:
-            return mid
-        elif (hi - lo) == 1:
-            return mid
-        elif err > 0:
-            hi = mid
-        else:
-            lo = mid
+def bisect_with_flag(masses, mass, error_tolerance=1e-5):
+    """Locate the entries of the sorted list `masses` within `error_tolerance`
+    PPM of `mass` using :mod:`bisect`.
+
+    The matching window is bracketed using the C implementation of :mod:`bisect`
+    over a list of floats rather than by walking a list of objects in Python.
+
+    Parameters
+    ----------
+    masses : list of float
+        The masses to search, sorted in increasing order
+    mass : float
+        The mass to search for
+    error_tolerance : float, optional
+        The PPM error tolerance to use when deciding whether a match has been found
+
+    Returns
+    -------
+    range or list:
+        If a match was found, the indices of all entries in `masses` which
+        match `mass`, otherwise a single-element list holding the index of
+        the last entry less than `mass`.
+    bool:
+        Whether or not a match was actually found
+    """
+    width = mass * error_tolerance
+    low_end = bisect_left(masses, mass - width)
+    high_end = bisect_right(masses, mass + width, low_end)
+    if low_end < high_end:
+        return range(low_end, high_end), True
+    return [max(low_end - 1, 0)], False
+
+
+def argmin_mass_error(masses, indices, mass):
+    """Find the index among `indices` whose entry in `masses` is closest
+    to `mass`.
+
+    Parameters
+    ----------
+    masses : list of float
+        The masses to search
+    indices : iterable of int
+        The positions in `masses` to consider
+    mass : float
+        The mass to compare against
+
+    Returns
+    -------
+    int or None
+        :const:`None` if `indices` is empty
+    """
+    best_index = None
+    best_error = float('inf')
+    for i in indices:
+        err = abs(masses[i] - mass) / mass
+        if err < best_error:
+            best_index = i
+            best_error = err
+    return best_index
+
+
+try:
+    from ._search import bisect_with_flag, argmin_mass_error
+except ImportError:
+    pass
 
 
 def smooth_overlaps(chromatogram_list, error_tolerance=1e-5):
-    chromatogram_list = sorted(chromatogram_list, key=lambda x: x.neutral_mass)
+    chromatogram_list = sorted(chromatogram_list, key=neutral_mass_getter)
+    masses = [c.neutral_mass for c in chromatogram_list]
     out = []
     last = chromatogram_list[0]
+    last_mass = masses[0]
     i = 1
-    while i < len(chromatogram_list):
+    n = len(chromatogram_list)
+    while i < n:
         current = chromatogram_list[i]
-        mass_error = abs((last.neutral_mass - current.neutral_mass) / current.neutral_mass)
+        current_mass = masses[i]
+        mass_error = abs((last_mass - current_mass) / current_mass)
         if mass_error <= error_tolerance:
             if last.overlaps_in_time(current):
                 last = last.merge(current)
                 last.created_at = "smooth_overlaps"
+                last_mass = last.neutral_mass
             else:
                 out.append(last)
                 last = current
+                last_mass = current_mass
         else:
             out.append(last)
             last = current
+            last_mass = current_mass
         i += 1
     out.append(last)
     return out
 
 
 class ChromatogramRetentionTimeInterval(Interval):
+    # :class:`Interval` does not declare __slots__, so instances still carry a
+    # __dict__ for the base class's attributes, but the attributes added here are
+    # stored in and read from slots.
+    __slots__ = ('neutral_mass', 'start_time', 'end_time')
+
     def __init__(self, chromatogram):
         super(ChromatogramRetentionTimeInterval, self).__init__(
             chromatogram.start_time, chromatogram.end_time, [chromatogram])
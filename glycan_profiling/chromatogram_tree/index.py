@@ -1,16 +1,28 @@
+from bisect import bisect_right
 from collections import defaultdict
+from operator import attrgetter
+
+import numpy as np
 
 from . import (smooth_overlaps, build_rt_interval_tree)
 
 
-def binary_search_with_flag(array, mass, error_tolerance=1e-5):
-    """Binary search an ordered array of objects with :attr:`neutral_mass`
-    using a PPM error tolerance of `error_toler
+mass_and_time_getter = attrgetter("neutral_mass", "start_time")
+start_time_getter = attrgetter("start_time")
+
+
+def search_mass_array(masses, mass, error_tolerance=1e-5):
+    """Search a sorted array of masses for the entry closest to `mass`
+    using a PPM error tolerance of `error_tolerance`.
+
+    This operates on a pre-extracted :class:`np.ndarray` of masses, letting
+    :func:`np.searchsorted` do the bracketing instead of walking the original
+    objects.
 
     Parameters
     ----------
-    array : list
-        An list of objects, sorted over :attr:`neutral_mass` in increasing order
+    masses : np.ndarray
+        An array of masses, sorted in increasing order
     mass : float
         The mass to search for
     error_tolerance : float, optional
@@ -19,45 +31,27 @@ def binary_search_with_flag(array, mass, error_tolerance=1e-5):
     Returns
     -------
     int:
-        The index in `array` of the best match
+        The index in `masses` of the best match
     bool:
         Whether or not a match was actually found, used to
         signal behavior to the caller.
     """
-    lo = 0
-    n = hi = len(array)
-    while hi != lo:
-        mid = (hi + lo) // 2
-        x = array[mid]
-        err = (x.neutral_mass - mass) / mass
-        if abs(err) <= error_tolerance:
-            best_index = mid
-            best_error = err
-            i = mid - 1
-            while i >= 0:
-                x = array[i]
-                err = abs((x.neutral_mass - mass) / mass)
-                if err < best_error:
-                    best_error = err
-                    best_index = i
-                i -= 1
-
-            i = mid + 1
-            while i < n:
-                x = array[i]
-                err = abs((x.neutral_mass - mass) / mass)
-                if err < best_error:
-                    best_error = err
-                    best_index = i
-                i += 1
-            return best_index, True
-        elif (hi - lo) == 1:
-            return mid, False
-        elif err > 0:
-            hi = mid
-        elif err < 0:
-            lo = mid
-    return 0, False
+    n = len(masses)
+    if n == 0:
+        return 0, False
+    index = np.searchsorted(masses, mass)
+    if index == n:
+        index = n - 1
+    elif index > 0 and (mass - masses[index - 1]) < (masses[index] - mass):
+        index -= 1
+    index = int(index)
+    return index, abs((masses[index] - mass) / mass) <= error_tolerance
+
+
+try:
+    from ._search import search_mass_array
+except ImportError:
+    pass
 
 
 class ChromatogramFilter(object):
@@ -77,16 +71,34 @@ class ChromatogramFilter(object):
     """
     def __init__(self, chromatograms, sort=True):
         if sort:
-            self.chromatograms = [c for c in sorted([c for c in chromatograms if len(c)], key=lambda x: (
-                x.neutral_mass, x.start_time))]
+            self.chromatograms = sorted([c for c in chromatograms if len(c)], key=mass_and_time_getter)
         else:
             self.chromatograms = list(chromatograms)
         self._key_map = None
         self._intervals = None
+        self._masses = None
+        self._start_times = None
+        self._end_times = None
 
     def _invalidate(self):
         self._key_map = None
         self._intervals = None
+        self._masses = None
+        self._start_times = None
+        self._end_times = None
+
+    def _build_mass_array(self):
+        self._masses = np.fromiter(
+            (c.neutral_mass for c in self.chromatograms),
+            dtype=np.float64, count=len(self.chromatograms))
+        return self._masses
+
+    def _build_time_arrays(self):
+        n = len(self.chromatograms)
+        self._start_times = np.fromiter(
+            (c.start_time for c in self.chromatograms), dtype=np.float64, count=n)
+        self._end_times = np.fromiter(
+            (c.end_time for c in self.chromatograms), dtype=np.float64, count=n)
 
     def _build_key_map(self):
         self._key_map = defaultdict(list)
@@ -105,6 +117,34 @@ class ChromatogramFilter(object):
             self._build_key_map()
         return self._key_map
 
+    @property
+    def masses(self):
+        """The neutral masses of :attr:`chromatograms`, as a parallel :class:`np.ndarray`
+        """
+        if self._masses is None:
+            self._build_mass_array()
+        return self._masses
+
+    @property
+    def start_times(self):
+        """The start times of :attr:`chromatograms`, as a parallel :class:`np.ndarray`
+        """
+        if self._start_times is None:
+            self._build_time_arrays()
+        return self._start_times
+
+    @property
+    def end_times(self):
+        """The end times of :attr:`chromatograms`, as a parallel :class:`np.ndarray`
+        """
+        if self._end_times is None:
+            self._build_time_arrays()
+        return self._end_times
+
+    def _take(self, mask):
+        return self.__class__(
+            [self.chromatograms[i] for i in np.flatnonzero(mask)], sort=False)
+
     @property
     def rt_interval_tree(self):
         if self._intervals is None:
@@ -130,7 +170,7 @@ class ChromatogramFilter(object):
             return None
 
     def find_mass(self, mass, ppm_error_tolerance=1e-5):
-        index, flag = binary_search_with_flag(self.chromatograms, mass, ppm_error_tolerance)
+        index, flag = self._binary_search(mass, ppm_error_tolerance)
         if flag:
             return self[index]
         else:
@@ -139,37 +179,22 @@ class ChromatogramFilter(object):
     def find_all_by_mass(self, mass, ppm_error_tolerance=1e-5):
         if len(self) == 0:
             return ChromatogramFilter([], sort=False)
-        center_index, _ = self._binary_search(mass, ppm_error_tolerance)
-        low_index = center_index
-        while low_index > 0:
-            x = self.chromatograms[low_index - 1]
-            if abs((mass - x.neutral_mass) / x.neutral_mass) > ppm_error_tolerance:
-                break
-            low_index -= 1
-
-        n = len(self.chromatograms)
-        high_index = center_index - 1
-        while high_index < n - 1:
-            x = self.chromatograms[high_index + 1]
-            if abs((mass - x.neutral_mass) / x.neutral_mass) > ppm_error_tolerance:
-                break
-            high_index += 1
-        if low_index == high_index == center_index:
-            x = self.chromatograms[center_index]
-            if abs((mass - x.neutral_mass) / x.neutral_mass) > ppm_error_tolerance:
-                return ChromatogramFilter([], sort=False)
-        items = self[low_index:high_index + 1]
+        masses = self.masses
+        width = mass * ppm_error_tolerance
+        low_index = np.searchsorted(masses, mass - width, side='left')
+        high_index = np.searchsorted(masses, mass + width, side='right')
         items = [
-            c for c in items if abs(
+            c for c in self.chromatograms[low_index:high_index] if abs(
                 (c.neutral_mass - mass) / mass) < ppm_error_tolerance
         ]
         return ChromatogramFilter(items, sort=False)
 
     def _binary_search(self, mass, error_tolerance=1e-5):
-        return binary_search_with_flag(self, mass, error_tolerance)
+        return search_mass_array(self.masses, mass, error_tolerance)
 
     def min_points(self, n=3, keep_if_msms=True):
         self.chromatograms = [c for c in self if (len(c) >= n) or c.has_msms]
+        self._invalidate()
         return self
 
     def split_sparse(self, delta_rt=1.):
@@ -177,6 +202,7 @@ class ChromatogramFilter(object):
             seg for c in self
             for seg in c.split_sparse(delta_rt)
         ]
+        self._invalidate()
         return self
 
     def __repr__(self):
@@ -189,15 +215,16 @@ class ChromatogramFilter(object):
         return str(list(self))
 
     def spanning(self, rt):
-        return self.__class__((c for c in self if c.start_time <= rt <= c.end_time), sort=False)
+        return self._take((self.start_times <= rt) & (rt <= self.end_times))
 
     def contained_in_interval(self, start, end):
-        return self.__class__(
-            (c for c in self if ((c.start_time <= start and c.end_time >= start) or (
-                c.start_time >= start and c.end_time <= end) or (
-                c.start_time >= start and c.end_time >= end and c.start_time <= end) or (
-                c.start_time <= start and c.end_time >= start) or (
-                c.start_time <= end and c.end_time >= end))), sort=False)
+        starts = self.start_times
+        ends = self.end_times
+        return self._take(
+            ((starts <= start) & (ends >= start)) | (
+                (starts >= start) & (ends <= end)) | (
+                (starts >= start) & (ends >= end) & (starts <= end)) | (
+                (starts <= end) & (ends >= end)))
 
     def after(self, t):
         out = []
@@ -221,25 +248,21 @@ class ChromatogramFilter(object):
         n = len(self)
         if n == 0:
             return ChromatogramFilter([])
-        low_index, flag = binary_search_with_flag(self.chromatograms, low, 1e-5)
-        low_index = max(0, min(low_index, n - 1))
-        if self[low_index].neutral_mass < low:
-            low_index += 1
-        high_index, flag = binary_search_with_flag(self.chromatograms, high, 1e-5)
-        high_index += 2
-        # high_index = min(n - 1, high_index)
-        if (high_index < n) and (self[high_index].neutral_mass > high):
-            high_index -= 1
-        items = self[low_index:high_index]
-        items = [c for c in items if low <= c.neutral_mass <= high]
-        return ChromatogramFilter(items, sort=False)
+        masses = self.masses
+        low_index = np.searchsorted(masses, low, side='left')
+        high_index = np.searchsorted(masses, high, side='right')
+        return ChromatogramFilter(self.chromatograms[low_index:high_index], sort=False)
 
     def filter(self, filter_fn):
         return self.__class__([x for x in self if filter_fn(x)], sort=False)
 
     @classmethod
     def process(cls, chromatograms, min_points=5, percentile=10, delta_rt=1.):
-        return cls(chromatograms).split_sparse(delta_rt).min_points(min_points)
+        return cls([
+            seg for c in chromatograms if len(c)
+            for seg in c.split_sparse(delta_rt)
+            if len(seg) >= min_points or seg.has_msms
+        ])
 
     def smooth_overlaps(self, mass_error_tolerance=1e-5):
         return self.__class__(smooth_overlaps(self, mass_error_tolerance))
@@ -248,8 +271,7 @@ class ChromatogramFilter(object):
         chroma = []
         chroma.extend(self)
         chroma.extend(other)
-        self.chromatograms = [c for c in sorted([c for c in chroma if len(c)], key=lambda x: (
-                              x.neutral_mass, x.start_time))]
+        self.chromatograms = sorted([c for c in chroma if len(c)], key=mass_and_time_getter)
         self._invalidate()
 
     def __add__(self, other):
@@ -261,12 +283,17 @@ class ChromatogramFilter(object):
 
 class DisjointChromatogramSet(object):
     def __init__(self, chromatograms):
-        self.group = sorted(chromatograms, key=lambda c: c.start_time)
+        self.group = sorted(chromatograms, key=start_time_getter)
+        self._start_times = [c.start_time for c in self.group]
 
     def linear_search(self, start_time, end_time):
         center_time = (start_time + end_time) / 2.
-        for chrom in self.group:
-            if chrom.start_time <= center_time <= chrom.end_time:
+        # The members of the group do not overlap, so the only candidate is
+        # the last one to start at or before `center_time`.
+        i = bisect_right(self._start_times, center_time) - 1
+        if i >= 0:
+            chrom = self.group[i]
+            if center_time <= chrom.end_time:
                 return chrom
 
     def find_overlap(self, chromatogram):
@@ -277,6 +304,7 @@ class DisjointChromatogramSet(object):
     def replace(self, original, replacement):
         i = self.group.index(original)
         self.group[i] = replacement
+        self._start_times[i] = replacement.start_time
 
     def __getitem__(self, i):
         return self.group[i]
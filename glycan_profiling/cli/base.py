@@ -1,3 +1,4 @@
+import os
 import multiprocessing
 import functools
 
@@ -45,6 +46,52 @@ class DocumentableArgument(click.Argument):
         self.doc_help = doc_help
 
 
+class LazyChoice(click.Choice):
+    """A :class:`click.Choice` whose choices are produced by calling
+    `get_choices` the first time they are needed, rather than when the
+    option is declared.
+
+    Values are validated with a dictionary lookup, which, unlike
+    :class:`click.Choice` in older versions of :mod:`click`, may also
+    ignore case.
+    """
+    def __init__(self, get_choices, case_sensitive=True):
+        self._get_choices = get_choices
+        self._choices = None
+        self._lookup = None
+        super(LazyChoice, self).__init__(())
+        self.case_sensitive = case_sensitive
+
+    @property
+    def choices(self):
+        if self._choices is None:
+            self._choices = tuple(self._get_choices())
+        return self._choices
+
+    @choices.setter
+    def choices(self, value):
+        # :meth:`click.Choice.__init__` assigns the placeholder choices
+        # given above, which are replaced by those from `get_choices`.
+        pass
+
+    def _get_lookup(self):
+        if self._lookup is None:
+            if self.case_sensitive:
+                self._lookup = {choice: choice for choice in self.choices}
+            else:
+                self._lookup = {choice.lower(): choice for choice in self.choices}
+        return self._lookup
+
+    def convert(self, value, param, ctx):
+        try:
+            if self.case_sensitive:
+                return self._get_lookup()[value]
+            return self._get_lookup()[value.lower()]
+        except (KeyError, AttributeError):
+            # Let click report the invalid value
+            return super(LazyChoice, self).convert(value, param, ctx)
+
+
 _option = click.option
 _argument = click.argument
 
@@ -63,9 +110,39 @@ click.option = option
 click.argument = argument
 
 
+def available_cpus():
+    """Count the CPUs this process may actually run on, respecting
+    the scheduler affinity mask set by container and job schedulers
+    where the platform supports it.
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        try:
+            return os.cpu_count() or 1
+        except AttributeError:
+            return multiprocessing.cpu_count()
+
+
+def configure_start_method(method, preload_modules=None):
+    """Select how worker processes are started, importing `preload_modules`
+    into the fork server once when using the `forkserver` method so that each
+    worker does not import them itself.
+    """
+    try:
+        multiprocessing.set_start_method(method, force=True)
+    except AttributeError:
+        raise click.BadParameter(
+            "Choosing a start method requires Python 3.4 or newer", param_hint="--start-method")
+    except ValueError as err:
+        raise click.BadParameter(str(err), param_hint="--start-method")
+    if method == 'forkserver' and preload_modules:
+        multiprocessing.set_forkserver_preload(list(preload_modules))
+
+
 processes_option = click.option(
-    "-p", "--processes", 'processes', type=click.IntRange(1, multiprocessing.cpu_count()),
-    default=min(multiprocessing.cpu_count(), 4), help=('Number of worker processes to use. Defaults to 4 '
+    "-p", "--processes", 'processes', type=click.IntRange(1, available_cpus()),
+    default=min(available_cpus(), 4), help=('Number of worker processes to use. Defaults to 4 '
                                                        'or the number of CPUs, whichever is lower'),
     # show_default=True
 )
@@ -1,9 +1,8 @@
 import sys
-import multiprocessing
 import click
 import textwrap
 
-from glycan_profiling.cli.base import cli, HiddenOption
+from glycan_profiling.cli.base import cli, HiddenOption, available_cpus, configure_start_method
 
 from glycan_profiling.cli.validators import (
     glycan_source_validators,
@@ -175,13 +174,20 @@ def _validate_glycan_source_identifier(ctx, param, value):
         click.secho("Specify --glycan-source before --glycan-source-identifier.", fg='yellow')
 
 
+# Modules every digestion and glycosylation worker needs, imported once by the
+# fork server instead of by each worker
+_glycopeptide_worker_preload_modules = [
+    "glypy", "glycopeptidepy", "glycan_profiling.database.builder.glycopeptide.common",
+    "glycan_profiling.database.builder.glycopeptide.proteomics.peptide_permutation"]
+
+
 def glycopeptide_hypothesis_common_options(cmd):
     options = [
         click.option("-u", "--occupied-glycosites", type=int, default=1,
                      help=("The number of occupied glycosylation sites permitted.")),
         click.option("-n", "--name", default=None, help="The name for the hypothesis to be created"),
-        click.option("-p", "--processes", 'processes', type=click.IntRange(1, multiprocessing.cpu_count()),
-                     default=min(multiprocessing.cpu_count(), 4),
+        click.option("-p", "--processes", 'processes', type=click.IntRange(1, available_cpus()),
+                     default=min(available_cpus(), 4),
                      help=('Number of worker processes to use. Defaults to 4 '
                            'or the number of CPUs, whichever is lower')),
         click.option("-G", "--glycan-source-identifier", required=False, default=None,
@@ -193,6 +199,11 @@ def glycopeptide_hypothesis_common_options(cmd):
                      help="The type of glycan information source to use"),
         click.option("-g", "--glycan-source", required=True,
                      help="The path, identity, or other specifier for the glycan source"),
+        click.option("--start-method", type=click.Choice(['fork', 'spawn', 'forkserver']), default=None,
+                     cls=HiddenOption),
+        click.option("--use-write-ahead-log", is_flag=True, default=False, cls=HiddenOption,
+                     help=("Switch an SQLite database to write-ahead-log mode while building "
+                           "glycopeptides, restoring its journal mode afterwards")),
     ]
     for opt in options:
         cmd = opt(cmd)
@@ -218,7 +229,8 @@ def glycopeptide_hypothesis_common_options(cmd):
 @click.option("--dry-run", default=False, is_flag=True, help="Do not save glycopeptides", cls=HiddenOption)
 def glycopeptide_fa(context, fasta_file, database_connection, enzyme, missed_cleavages, occupied_glycosites, name,
                     constant_modification, variable_modification, processes, glycan_source, glycan_source_type,
-                    glycan_source_identifier=None, reverse=False, dry_run=False):
+                    glycan_source_identifier=None, reverse=False, dry_run=False, start_method=None,
+                    use_write_ahead_log=False):
     '''Constructs a glycopeptide hypothesis from a FASTA file of proteins and a
     collection of glycans.
     '''
@@ -237,7 +249,9 @@ def glycopeptide_fa(context, fasta_file, database_connection, enzyme, missed_cle
                            glycan_source, glycan_source_type,
                            glycan_source_identifier)
 
-    processes = min(multiprocessing.cpu_count(), processes)
+    processes = min(available_cpus(), processes)
+    if start_method is not None:
+        configure_start_method(start_method, _glycopeptide_worker_preload_modules)
 
     if name is not None:
         name = validate_glycopeptide_hypothesis_name(
@@ -260,7 +274,8 @@ def glycopeptide_fa(context, fasta_file, database_connection, enzyme, missed_cle
         max_missed_cleavages=missed_cleavages,
         max_glycosylation_events=occupied_glycosites,
         hypothesis_name=name,
-        n_processes=processes)
+        n_processes=processes,
+        use_write_ahead_log=use_write_ahead_log)
     builder.display_header()
     builder.start()
     return builder.hypothesis_id
@@ -282,7 +297,7 @@ def glycopeptide_fa(context, fasta_file, database_connection, enzyme, missed_cle
                     "the FASTA file used is not local."))
 def glycopeptide_mzid(context, mzid_file, database_connection, name, occupied_glycosites, target_protein,
                       target_protein_re, processes, glycan_source, glycan_source_type, glycan_source_identifier,
-                      reference_fasta):
+                      reference_fasta, start_method=None, use_write_ahead_log=False):
     '''Constructs a glycopeptide hypothesis from a MzIdentML file of proteins and a
     collection of glycans.
     '''
@@ -292,7 +307,9 @@ def glycopeptide_mzid(context, mzid_file, database_connection, name, occupied_gl
                            glycan_source, glycan_source_type,
                            glycan_source_identifier)
 
-    processes = min(multiprocessing.cpu_count(), processes)
+    processes = min(available_cpus(), processes)
+    if start_method is not None:
+        configure_start_method(start_method, _glycopeptide_worker_preload_modules)
 
     if name is not None:
         name = validate_glycopeptide_hypothesis_name(
@@ -309,7 +326,8 @@ def glycopeptide_mzid(context, mzid_file, database_connection, name, occupied_gl
         target_proteins=proteins,
         max_glycosylation_events=occupied_glycosites,
         reference_fasta=reference_fasta,
-        n_processes=processes)
+        n_processes=processes,
+        use_write_ahead_log=use_write_ahead_log)
     builder.display_header()
     builder.start()
     return builder.hypothesis_id
@@ -106,23 +106,53 @@ def configure_logging(level=None, log_file_name=None, log_file_mode=None):
 permission_mask = S_IRUSR & S_IWUSR & S_IXUSR & S_IRGRP & S_IWGRP & S_IROTH & S_IWOTH
 
 
-class FlexibleFileHandler(FileHandler):
-    def _get_available_file(self):
-        basename = current_name = self.baseFilename
-        suffix = 0
-        while suffix < 2 ** 16:
-            if not os.path.exists(current_name):
-                break
-            elif os.access(current_name, os.W_OK):
-                break
-            else:
-                suffix += 1
-                current_name = "%s.%s" % (basename, suffix)
-        if suffix < 2 ** 16:
-            return current_name
-        else:
+def _is_available(path):
+    return not os.path.exists(path) or os.access(path, os.W_OK)
+
+
+def find_available_file(basename, max_suffix=2 ** 16):
+    """Find a writable path for a log file, appending a numeric suffix to
+    `basename` if it is already taken by a file which cannot be written to.
+
+    Rather than probing every suffix in turn, suffixes are probed at doubling
+    intervals until an available one is found, and the gap between the last
+    unavailable and the first available probe is then bisected.
+
+    Parameters
+    ----------
+    basename : str
+        The preferred path
+    max_suffix : int, optional
+        The largest suffix to try before falling back to a random one
+
+    Returns
+    -------
+    str
+    """
+    def candidate(suffix):
+        if suffix == 0:
+            return basename
+        return "%s.%s" % (basename, suffix)
+
+    if _is_available(basename):
+        return basename
+    low = 0
+    high = 1
+    while not _is_available(candidate(high)):
+        low = high
+        high *= 2
+        if high >= max_suffix:
             return "%s.%s" % (basename, uuid.uuid4().hex)
+    while high - low > 1:
+        mid = (low + high) // 2
+        if _is_available(candidate(mid)):
+            high = mid
+        else:
+            low = mid
+    return candidate(high)
 
+
+class FlexibleFileHandler(FileHandler):
     def _open(self):
         """
         Open the current base file with the (original) mode and encoding.
@@ -170,17 +200,4 @@ class LazyFile(object):
         return self._file.flush()
 
     def _get_available_file(self):
-        basename = current_name = self.name
-        suffix = 0
-        while suffix < 2 ** 16:
-            if not os.path.exists(current_name):
-                break
-            elif os.access(current_name, os.W_OK):
-                break
-            else:
-                suffix += 1
-                current_name = "%s.%s" % (basename, suffix)
-        if suffix < 2 ** 16:
-            return current_name
-        else:
-            return "%s.%s" % (basename, uuid.uuid4().hex)
+        return find_available_file(self.name)
@@ -1,22 +1,204 @@
 from collections import defaultdict
 
+from threading import Thread
+
 import click
 import os
 
-import ms_peak_picker
-import ms_deisotope
-
-from ms_deisotope import MSFileLoader
-from ms_deisotope.output.mzml import ProcessedMzMLDeserializer
-from ms_deisotope.feature_map import quick_index
-
-from glycan_profiling.cli.base import cli, HiddenOption, processes_option
+from glycan_profiling.cli.base import (
+    cli, HiddenOption, LazyChoice, processes_option, configure_start_method)
 from glycan_profiling.cli.validators import (
     AveragineParamType)
 
-from glycan_profiling.profiler import (
-    SampleConsumer,
-    ThreadedMzMLScanCacheHandler)
+# The signal processing and profiling modules are imported by the commands
+# that use them, so that --help and the lightweight commands start quickly.
+
+
+def _registered_filter_names():
+    from ms_peak_picker.scan_filter import filter_register
+    # Importing this module registers glycan_profiling's own scan filters
+    import glycan_profiling.scan_filter
+    return sorted(filter_register.keys())
+
+
+# Resolve the registered scan filter names once, when an option first needs
+# them, and share them between the options below.
+_FILTER_CHOICE = LazyChoice(_registered_filter_names, case_sensitive=False)
+
+
+def metadata_loader(ms_file):
+    """Open `ms_file` with :func:`ms_deisotope.MSFileLoader` without decoding
+    the binary data arrays of each spectrum, when the reader supports it, for
+    reading scan metadata like identifiers, times and spectrum representation.
+
+    Parameters
+    ----------
+    ms_file : str
+        Path to the mass spectral data file
+
+    Returns
+    -------
+    ms_deisotope.data_source.common.ScanIterator
+    """
+    from ms_deisotope import MSFileLoader
+    try:
+        return MSFileLoader(ms_file, decode_binary=False)
+    except TypeError:
+        # This reader type always decodes its arrays
+        return MSFileLoader(ms_file)
+
+
+def cached_loader(ms_file, metadata_only=False):
+    """Open `ms_file` with :func:`ms_deisotope.MSFileLoader`, saving the
+    byte offset index built by the underlying parser next to the file so
+    later invocations can load it instead of re-scanning the whole file.
+
+    Parameters
+    ----------
+    ms_file : str
+        Path to the mass spectral data file
+    metadata_only : bool
+        Whether to open the file with :func:`metadata_loader`
+
+    Returns
+    -------
+    ms_deisotope.data_source.common.ScanIterator
+    """
+    if metadata_only:
+        loader = metadata_loader(ms_file)
+    else:
+        from ms_deisotope import MSFileLoader
+        loader = MSFileLoader(ms_file)
+    source = getattr(loader, "_source", None)
+    if source is not None and hasattr(source, "write_byte_offsets"):
+        try:
+            if not source._check_has_byte_offset_file():
+                source.write_byte_offsets()
+        except (IOError, OSError):
+            # The index is only a cache, so an unwritable directory is not
+            # an error
+            pass
+    return loader
+
+
+def make_baseline_filter(method, scale):
+    from ms_peak_picker.scan_filter import FTICRBaselineRemoval
+    from glycan_profiling.scan_filter import SNIPBaselineRemoval, TopHatBaselineRemoval
+    if method == 'snip':
+        return SNIPBaselineRemoval()
+    elif method == 'tophat':
+        return TopHatBaselineRemoval()
+    return FTICRBaselineRemoval(scale=scale, window_length=2)
+
+
+def prebuild_averagine_cache(averagine, charge_range, truncate_after, ignore_below,
+                             min_mz=10, max_mz=3000):
+    """Build an :class:`~ms_deisotope.averagine.AveragineCache` holding the
+    isotopic pattern for every integral m/z between `min_mz` and `max_mz` at
+    every charge in `charge_range`.
+
+    The patterns are requested through :meth:`AveragineCache.isotopic_cluster`
+    with the same `truncate_after` and `ignore_below` the deconvoluter passes, so
+    they are the entries it will look up. `charge_range` may be negative, as in
+    ``(-1, -4)``, in which case the patterns are built for negative charges.
+    """
+    from ms_deisotope.averagine import AveragineCache
+    cache = AveragineCache(averagine)
+    sign = -1 if charge_range[0] < 0 else 1
+    low, high = sorted((abs(charge_range[0]), abs(charge_range[1])))
+    for charge in range(low, high + 1):
+        for mz in range(min_mz, max_mz):
+            cache.isotopic_cluster(
+                mz, charge * sign, truncate_after=truncate_after,
+                ignore_below=ignore_below)
+    return cache
+
+
+_ms1_transforms = {}
+_msn_transforms = {}
+
+
+def ms1_transforms(is_profile, background_reduction, baseline_method='fticr', fast_sg=False):
+    """Build the fixed MS1 scan filters for a configuration, reusing the
+    same filter instances for repeated configurations.
+    """
+    key = (is_profile, background_reduction, baseline_method, fast_sg)
+    try:
+        return _ms1_transforms[key]
+    except KeyError:
+        pass
+    if is_profile:
+        if background_reduction:
+            if fast_sg:
+                from glycan_profiling.scan_filter import FastSavitskyGolayFilter
+                smoother = FastSavitskyGolayFilter()
+            else:
+                from ms_peak_picker.scan_filter import SavitskyGolayFilter
+                smoother = SavitskyGolayFilter()
+            transforms = (make_baseline_filter(baseline_method, background_reduction), smoother)
+        else:
+            transforms = ()
+    elif background_reduction > 0.0 or baseline_method == 'fticr':
+        # The FTICR filter has always run on centroided scans and is scaled by
+        # the reduction factor, while the other methods only run when asked to.
+        transforms = (make_baseline_filter(baseline_method, background_reduction),)
+    else:
+        transforms = ()
+    _ms1_transforms[key] = transforms
+    return transforms
+
+
+def msn_transforms(background_reduction, baseline_method='fticr'):
+    """Build the fixed MS^n scan filters for a configuration, reusing the
+    same filter instances for repeated configurations.
+    """
+    key = (background_reduction, baseline_method)
+    try:
+        return _msn_transforms[key]
+    except KeyError:
+        pass
+    if background_reduction > 0.0:
+        transforms = (make_baseline_filter(baseline_method, background_reduction),)
+    else:
+        transforms = ()
+    _msn_transforms[key] = transforms
+    return transforms
+
+
+# Modules every deconvolution worker needs, imported once by the fork server
+# instead of by each worker
+_worker_preload_modules = [
+    "numpy", "ms_peak_picker", "ms_deisotope", "glycan_profiling.scan_filter",
+    "glycan_profiling.piped_deconvolve"]
+
+
+def locate_ms1_scan_id(loader, time):
+    return loader._locate_ms1_scan(loader.get_scan_by_time(time)).id
+
+
+class ScanTimeLookup(Thread):
+    """Resolve the id of the MS1 scan nearest to `time` using a separate
+    reader on a background thread.
+    """
+    def __init__(self, ms_file, time):
+        Thread.__init__(self)
+        self.daemon = True
+        self.ms_file = ms_file
+        self.time = time
+        self.scan_id = None
+        self.error = None
+
+    def run(self):
+        try:
+            self.scan_id = locate_ms1_scan_id(metadata_loader(self.ms_file), self.time)
+        except Exception as error:
+            self.error = error
+
+    def result(self):
+        self.join()
+        if self.error is not None:
+            raise self.error
+        return self.scan_id
 
 
 @cli.group('mzml', short_help='Inspect and preprocess mzML files')
@@ -28,8 +210,8 @@ def mzml_cli():
 @click.argument("ms-file", type=click.Path(exists=True))
 @click.argument("rt", type=float)
 def rt_to_id(ms_file, rt):
-    loader = MSFileLoader(ms_file)
-    id = loader._locate_ms1_scan(loader.get_scan_by_time(rt)).id
+    loader = cached_loader(ms_file, metadata_only=True)
+    id = locate_ms1_scan_id(loader, rt)
     click.echo(id)
 
 
@@ -55,9 +237,9 @@ def rt_to_id(ms_file, rt):
               help=('Highest absolute charge state to consider'))
 @click.option("-n", "--name", default=None,
               help="Name for the sample run to be stored. Defaults to the base name of the input mzML file")
-@click.option("-t", "--score-threshold", type=float, default=SampleConsumer.MS1_SCORE_THRESHOLD,
+@click.option("-t", "--score-threshold", type=float, default=None,
               help="Minimum score to accept an isotopic pattern fit in an MS1 scan")
-@click.option("-tn", "--msn-score-threshold", type=float, default=SampleConsumer.MSN_SCORE_THRESHOLD,
+@click.option("-tn", "--msn-score-threshold", type=float, default=None,
               help="Minimum score to accept an isotopic pattern fit in an MS^n scan")
 @click.option("-m", "--missed-peaks", type=int, default=3,
               help="Number of missing peaks to permit before an isotopic fit is discarded")
@@ -70,11 +252,12 @@ def rt_to_id(ms_file, rt):
 @click.option("-bn", "--msn-background-reduction", type=float, default=0., help=(
               "Background reduction factor. Larger values more aggresively remove low abundance"
               " signal in MS^n scans."))
-@click.option("-r", '--transform', multiple=True, type=click.Choice(
-    sorted(ms_peak_picker.scan_filter.filter_register.keys())),
+@click.option("-bm", "--baseline-method", type=click.Choice(['fticr', 'snip', 'tophat']), default='fticr', help=(
+              "Algorithm used for background reduction. The reduction factor only applies to fticr,"
+              " the other methods only use it to decide whether to run."))
+@click.option("-r", '--transform', multiple=True, type=_FILTER_CHOICE,
     help="Scan transformations to apply to MS1 scans. May specify more than once.")
-@click.option("-rn", '--msn-transform', multiple=True, type=click.Choice(
-    sorted(ms_peak_picker.scan_filter.filter_register.keys())),
+@click.option("-rn", '--msn-transform', multiple=True, type=_FILTER_CHOICE,
     help="Scan transformations to apply to MS^n scans. May specify more than once.")
 @click.option("-v", "--extract-only-tandem-envelopes", is_flag=True, default=False,
               help='Only work on regions that will be chosen for MS/MS')
@@ -89,14 +272,38 @@ def rt_to_id(ms_file, rt):
 @click.option("-n", "--signal-to-noise-threshold", default=1.0, type=float, help=(
     "Signal-to-noise ratio threshold to apply when filtering peaks"))
 @click.option("-mo", "--mass-offset", default=0.0, type=float, help=("Shift peak masses by the given amount"))
+@click.option("--storage-format", type=click.Choice(['mzml', 'binary']), default='mzml', help=(
+    "Format to write processed scans in. binary is an append-only peak list format"
+    " which is faster to write but can only be read by BinaryScanCacheReader."))
+@click.option("--scan-batch-size", default=1, type=click.IntRange(1), cls=HiddenOption)
+@click.option("--start-method", type=click.Choice(['fork', 'spawn', 'forkserver']), default=None,
+              cls=HiddenOption)
+@click.option("--fast-sg", is_flag=True, default=False, help=(
+    "Smooth profile MS1 scans with a precomputed Savitsky-Golay kernel"))
+@click.option("--prebuild-averagine-cache", "prebuild_averagine", is_flag=True, default=False,
+              cls=HiddenOption)
 def preprocess(ms_file, outfile_path, averagine=None, start_time=None, end_time=None, maximum_charge=None,
-               name=None, msn_averagine=None, score_threshold=35., msn_score_threshold=10., missed_peaks=1,
-               msn_missed_peaks=1, background_reduction=5., msn_background_reduction=0.,
+               name=None, msn_averagine=None, score_threshold=None, msn_score_threshold=None, missed_peaks=1,
+               msn_missed_peaks=1, background_reduction=5., msn_background_reduction=0., baseline_method='fticr',
                transform=None, msn_transform=None, processes=4, extract_only_tandem_envelopes=False,
                ignore_msn=False, profile=False, isotopic_strictness=2.0, ms1_averaging=0,
-               msn_isotopic_strictness=0.0, signal_to_noise_threshold=1.0, mass_offset=0.0, deconvolute=True):
+               msn_isotopic_strictness=0.0, signal_to_noise_threshold=1.0, mass_offset=0.0, storage_format='mzml', scan_batch_size=1, start_method=None,
+               fast_sg=False, prebuild_averagine=False, deconvolute=True):
     '''Convert raw mass spectra data into deisotoped neutral mass peak lists written to mzML.
     '''
+    import ms_deisotope
+    from ms_peak_picker.scan_filter import RecalibrateMass
+
+    from glycan_profiling.profiler import (
+        SampleConsumer,
+        ThreadedMzMLScanCacheHandler)
+    from glycan_profiling.piped_deconvolve import ScorerSpecification
+    from glycan_profiling.scan_cache import BinaryScanCacheHandler
+
+    if score_threshold is None:
+        score_threshold = SampleConsumer.MS1_SCORE_THRESHOLD
+    if msn_score_threshold is None:
+        msn_score_threshold = SampleConsumer.MSN_SCORE_THRESHOLD
     if transform is None:
         transform = []
     if msn_transform is None:
@@ -108,21 +315,54 @@ def preprocess(ms_file, outfile_path, averagine=None, start_time=None, end_time=
             fg='red')
         raise click.Abort("Cannot use both --ignore-msn and --extract-only-tandem-envelopes")
 
-    cache_handler_type = ThreadedMzMLScanCacheHandler
+    if storage_format == 'binary':
+        cache_handler_type = BinaryScanCacheHandler
+    else:
+        cache_handler_type = ThreadedMzMLScanCacheHandler
+    if start_method is not None:
+        configure_start_method(start_method, _worker_preload_modules)
     click.echo("Preprocessing %s" % ms_file)
     minimum_charge = 1 if maximum_charge > 0 else -1
     charge_range = (minimum_charge, maximum_charge)
 
-    loader = MSFileLoader(ms_file)
-
-    start_scan_id = loader._locate_ms1_scan(
-        loader.get_scan_by_time(start_time)).id
-    end_scan_id = loader._locate_ms1_scan(
-        loader.get_scan_by_time(end_time)).id
+    # Only scan metadata is needed to resolve the processing range, so
+    # avoid decoding each spectrum's data arrays.
+    loader = cached_loader(ms_file, metadata_only=True)
+
+    # Locate the first MS1 scan once and reuse it for both the profile check
+    # and the default start of the processing range. Whether a spectrum is
+    # profile or centroid is read from its metadata. The first scan of the
+    # file may be an MSn scan, so search from it rather than reading the
+    # first bunch, whose precursor may be missing.
+    first_scan = loader._locate_ms1_scan(loader.get_scan_by_index(0))
+    last_scan = loader._locate_ms1_scan(
+        loader.get_scan_by_index(len(loader) - 1))
+
+    if (start_time > last_scan.scan_time or end_time < first_scan.scan_time or
+            start_time > end_time):
+        click.secho("No MS1 scans between %0.2f and %0.2f, nothing to do." % (
+            start_time, end_time), fg='yellow')
+        return
+
+    # No need to search by time for an end past the last MS1 scan
+    end_time = min(end_time, last_scan.scan_time)
+    end_lookup = None
+    if end_time < last_scan.scan_time:
+        # Search for the end scan on a second reader while the start scan
+        # is located on this one.
+        end_lookup = ScanTimeLookup(ms_file, end_time)
+        end_lookup.start()
+
+    if start_time > first_scan.scan_time:
+        start_scan_id = locate_ms1_scan_id(loader, start_time)
+    else:
+        start_scan_id = first_scan.id
+    if end_lookup is None:
+        end_scan_id = last_scan.id
+    else:
+        end_scan_id = end_lookup.result()
 
-    loader.reset()
-    loader.start_from_scan(start_scan_id)
-    is_profile = (next(loader).precursor.is_profile or profile)
+    is_profile = (first_scan.is_profile or profile)
     if is_profile:
         click.secho("Spectra are profile")
     else:
@@ -143,43 +383,36 @@ def preprocess(ms_file, outfile_path, averagine=None, start_time=None, end_time=
 
     if is_profile:
         ms1_peak_picking_args = {
-            "transforms": [
-            ] + list(transform),
+            "transforms": list(transform) + list(
+                ms1_transforms(True, background_reduction, baseline_method, fast_sg)),
             "signal_to_noise_threshold": signal_to_noise_threshold
         }
-        if background_reduction:
-            ms1_peak_picking_args['transforms'].append(
-                ms_peak_picker.scan_filter.FTICRBaselineRemoval(
-                    scale=background_reduction, window_length=2))
-            ms1_peak_picking_args['transforms'].append(ms_peak_picker.scan_filter.SavitskyGolayFilter())
     else:
         ms1_peak_picking_args = {
-            "transforms": [
-                ms_peak_picker.scan_filter.FTICRBaselineRemoval(
-                    scale=background_reduction, window_length=2),
-            ] + list(transform)
+            "transforms": list(
+                ms1_transforms(False, background_reduction, baseline_method, fast_sg)) + list(transform)
         }
 
-    if msn_background_reduction > 0.0:
-        msn_peak_picking_args = {
-            "transforms": [
-                ms_peak_picker.scan_filter.FTICRBaselineRemoval(
-                    scale=msn_background_reduction, window_length=2),
-            ] + list(msn_transform)
-        }
-    else:
-        msn_peak_picking_args = {
-            "transforms": [
-            ] + list(msn_transform)
-        }
+    msn_peak_picking_args = {
+        "transforms": list(msn_transforms(msn_background_reduction, baseline_method)) + list(msn_transform)
+    }
 
     if mass_offset != 0.0:
         ms1_peak_picking_args['transforms'].append(
-                ms_peak_picker.scan_filter.RecalibrateMass(offset=mass_offset))
+                RecalibrateMass(offset=mass_offset))
         msn_peak_picking_args['transforms'].append(
-                ms_peak_picker.scan_filter.RecalibrateMass(offset=mass_offset))
+                RecalibrateMass(offset=mass_offset))
 
     if deconvolute:
+        if prebuild_averagine:
+            # Build the isotopic pattern tables for the requested charges once here
+            # so that the worker processes share them instead of each re-computing
+            # them on demand.
+            averagine = [
+                prebuild_averagine_cache(
+                    avg, charge_range, SampleConsumer.MS1_ISOTOPIC_PATTERN_WIDTH,
+                    SampleConsumer.MS1_IGNORE_BELOW)
+                for avg in averagine]
         if len(averagine) == 1:
             averagine = averagine[0]
             ms1_deconvoluter_type = ms_deisotope.deconvolution.AveraginePeakDependenceGraphDeconvoluter
@@ -187,7 +420,7 @@ def preprocess(ms_file, outfile_path, averagine=None, start_time=None, end_time=
             ms1_deconvoluter_type = ms_deisotope.deconvolution.MultiAveraginePeakDependenceGraphDeconvoluter
 
         ms1_deconvolution_args = {
-            "scorer": ms_deisotope.scoring.PenalizedMSDeconVFitter(score_threshold, isotopic_strictness),
+            "scorer": ScorerSpecification("PenalizedMSDeconVFitter", score_threshold, isotopic_strictness),
             "max_missed_peaks": missed_peaks,
             "averagine": averagine,
             "truncate_after": SampleConsumer.MS1_ISOTOPIC_PATTERN_WIDTH,
@@ -196,10 +429,10 @@ def preprocess(ms_file, outfile_path, averagine=None, start_time=None, end_time=
         }
 
         if msn_isotopic_strictness >= 1:
-            msn_isotopic_scorer = ms_deisotope.scoring.PenalizedMSDeconVFitter(
-                msn_score_threshold, msn_isotopic_strictness)
+            msn_isotopic_scorer = ScorerSpecification(
+                "PenalizedMSDeconVFitter", msn_score_threshold, msn_isotopic_strictness)
         else:
-            msn_isotopic_scorer = ms_deisotope.scoring.MSDeconVFitter(msn_score_threshold)
+            msn_isotopic_scorer = ScorerSpecification("MSDeconVFitter", msn_score_threshold)
 
         msn_deconvolution_args = {
             "scorer": msn_isotopic_scorer,
@@ -224,7 +457,8 @@ def preprocess(ms_file, outfile_path, averagine=None, start_time=None, end_time=
         extract_only_tandem_envelopes=extract_only_tandem_envelopes,
         ignore_tandem_scans=ignore_msn,
         ms1_averaging=ms1_averaging,
-        deconvolute=deconvolute)
+        deconvolute=deconvolute,
+        scan_batch_size=scan_batch_size)
     consumer.display_header()
     consumer.start()
 
@@ -232,9 +466,12 @@ def preprocess(ms_file, outfile_path, averagine=None, start_time=None, end_time=
 @mzml_cli.command("info", short_help='Summary information describing a processed mzML file')
 @click.argument("ms-file", type=click.Path(exists=True, file_okay=True, dir_okay=False))
 def msfile_info(ms_file):
+    from ms_deisotope.output.mzml import ProcessedMzMLDeserializer
+    from ms_deisotope.feature_map import quick_index
+
     reader = ProcessedMzMLDeserializer(ms_file)
     if not reader.has_index_file():
-        index, intervals = quick_index.index(ms_deisotope.MSFileLoader(ms_file))
+        index, intervals = quick_index.index(cached_loader(ms_file))
         reader.extended_index = index
         with open(reader._index_file_name, 'w') as handle:
             index.serialize(handle)
@@ -280,11 +517,9 @@ def msfile_info(ms_file):
 @click.option("-bn", "--msn-background-reduction", type=float, default=0., help=(
               "Background reduction factor. Larger values more aggresively remove low abundance"
               " signal in MS^n scans."))
-@click.option("-r", '--transform', multiple=True, type=click.Choice(
-    sorted(ms_peak_picker.scan_filter.filter_register.keys())),
+@click.option("-r", '--transform', multiple=True, type=_FILTER_CHOICE,
     help="Scan transformations to apply to MS1 scans. May specify more than once.")
-@click.option("-rn", '--msn-transform', multiple=True, type=click.Choice(
-    sorted(ms_peak_picker.scan_filter.filter_register.keys())),
+@click.option("-rn", '--msn-transform', multiple=True, type=_FILTER_CHOICE,
     help="Scan transformations to apply to MS^n scans. May specify more than once.")
 @click.option("-v", "--extract-only-tandem-envelopes", is_flag=True, default=False,
               help='Only work on regions that will be chosen for MS/MS')
@@ -3,6 +3,8 @@ import re
 import traceback
 from functools import partial
 
+from six import string_types as basestring
+
 import click
 
 from sqlalchemy.exc import OperationalError, ArgumentError
@@ -11,6 +11,7 @@ from glycan_profiling.composition_distribution_model.graph import (
     weighted_laplacian_matrix,
     weighted_adjacency_matrix,
     weighted_degree_matrix,
+    build_weighted_laplacian,
     BlockLaplacian,
     network_indices,
     scale_network,
@@ -52,6 +53,7 @@ __all__ = [
     "weighted_laplacian_matrix",
     "weighted_adjacency_matrix",
     "weighted_degree_matrix",
+    "build_weighted_laplacian",
     "BlockLaplacian",
     "network_indices",
     "scale_network",
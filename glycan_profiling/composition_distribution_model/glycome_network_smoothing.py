@@ -1,3 +1,4 @@
+import copy
 from collections import OrderedDict, defaultdict
 
 import numpy as np
@@ -29,6 +30,42 @@ from .grid_search import (
     ThresholdSelectionGridSearch)
 
 
+def _hat_diagonal_complements(spectrum, lambda_values, indices=None):
+    """Compute :math:`1 - \\mathrm{diag}((I + \\lambda L)^{-1})` for each value of
+    :math:`\\lambda`, given the eigendecomposition :math:`L = V \\Lambda V^T` of
+    the Laplacian :math:`L`.
+
+    Each entry is :math:`\\sum_k V_{ik}^2 \\lambda\\Lambda_k / (1 + \\lambda\\Lambda_k)`,
+    so the whole sweep is a single matrix product rather than one factorization
+    per :math:`\\lambda`. Working with the complement directly keeps it exact for
+    nodes without neighbors, where it is zero and dominates the PRESS statistic.
+
+    Parameters
+    ----------
+    spectrum : tuple
+        The eigenvalues and eigenvectors of :math:`L`, as returned by
+        :func:`numpy.linalg.eigh`
+    lambda_values : np.ndarray
+        The values of :math:`\\lambda` to evaluate
+    indices : Sequence, optional
+        The diagonal positions to compute. Defaults to all of them.
+
+    Returns
+    -------
+    np.ndarray
+        One column per value of :math:`\\lambda`
+    """
+    eigenvalues, eigenvectors = spectrum
+    # A Laplacian has one zero eigenvalue per connected component, which
+    # eigh only resolves to within rounding error.
+    tolerance = np.abs(eigenvalues).max(initial=0) * len(eigenvalues) * np.finfo(float).eps
+    eigenvalues = np.where(eigenvalues > tolerance, eigenvalues, 0.0)
+    if indices is not None:
+        eigenvectors = eigenvectors[indices, :]
+    scaled = np.outer(eigenvalues, lambda_values)
+    return (eigenvectors ** 2).dot(scaled / (1. + scaled))
+
+
 def _has_glycan_composition(x):
     try:
         gc = x.glycan_composition
@@ -101,6 +138,7 @@ class VariableObservationAggregation(object):
 
 
 class GlycomeModel(LaplacianSmoothingModel):
+    _threshold_cache_size = 32
 
     def __init__(self, observed_compositions, network, belongingness_matrix=None,
                  regularize=DEFAULT_LAPLACIAN_REGULARIZATION,
@@ -136,6 +174,7 @@ class GlycomeModel(LaplacianSmoothingModel):
 
     def _configure_with_network(self, network):
         self._network = network
+        self._threshold_cache = OrderedDict()
         self.network = assign_network(network.clone(), self._observed_compositions)
 
         self.neighborhood_walker = NeighborhoodWalker(self.network)
@@ -159,15 +198,36 @@ class GlycomeModel(LaplacianSmoothingModel):
 
     def set_threshold(self, threshold):
         accepted = [
-            g for g in self._observed_compositions if g.score > threshold]
+            i for i, g in enumerate(self._observed_compositions) if g.score > threshold]
         if len(accepted) == 0:
             raise ValueError("Threshold %f produces an empty observed set" % (threshold,))
-        self.network = assign_network(self._network.clone(), accepted)
-
-        self.obs_ix, self.miss_ix = network_indices(self.network)
+        # BlockLaplacian partitions nodes on their internal score, which need not
+        # equal the score used to accept a composition, so the partition depends
+        # on which accepted compositions fall below the threshold by that measure,
+        # and whether the unobserved nodes' zero scores do.
+        below = tuple(
+            i for i in accepted if self._observed_compositions[i].internal_score < threshold)
+        key = (tuple(accepted), below, threshold > 0)
+        try:
+            state = self._threshold_cache.pop(key)
+        except KeyError:
+            network = assign_network(
+                self._network.clone(), [self._observed_compositions[i] for i in accepted])
+            obs_ix, miss_ix = network_indices(network)
+            block_L = BlockLaplacian(network, threshold=threshold, regularize=self.block_L.regularize)
+            state = (network, obs_ix, miss_ix, block_L)
+            if len(self._threshold_cache) >= self._threshold_cache_size:
+                self._threshold_cache.popitem(last=False)
+        else:
+            if state[-1].threshold != threshold:
+                # The partition is the same, so share its blocks, but record the
+                # threshold it was requested with.
+                block_L = copy.copy(state[-1])
+                block_L.threshold = threshold
+                state = state[:-1] + (block_L,)
+        self._threshold_cache[key] = state
+        self.network, self.obs_ix, self.miss_ix, self.block_L = state
         self._populate()
-
-        self.block_L = BlockLaplacian(self.network, threshold=threshold, regularize=self.block_L.regularize)
         self.threshold = self.block_L.threshold
 
     def reset(self):
@@ -189,16 +249,18 @@ class GlycomeModel(LaplacianSmoothingModel):
         self.A0 = self.normalized_belongingness_matrix[self.obs_ix, :]
 
     def build_belongingness_matrix(self):
-        neighborhood_count = len(self.neighborhood_walker.neighborhoods)
+        walker = self.neighborhood_walker
+        neighborhood_count = len(walker.neighborhoods)
         belongingness_matrix = np.zeros(
             (len(self.network), neighborhood_count))
 
-        for node in self.network:
-            was_in = self.neighborhood_walker.neighborhood_assignments[node]
-            for i, neighborhood in enumerate(self.neighborhood_walker.neighborhoods):
-                if neighborhood.name in was_in:
-                    belongingness_matrix[node.index, i] = self.neighborhood_walker.compute_belongingness(
-                        node, neighborhood.name)
+        # Only the members of a neighborhood can belong to it, so visit each
+        # neighborhood's member list rather than testing every node against
+        # every neighborhood.
+        for i, neighborhood in enumerate(walker.neighborhoods):
+            for node in walker.neighborhood_maps[neighborhood.name]:
+                belongingness_matrix[node.index, i] = walker.compute_belongingness(
+                    node, neighborhood.name)
         return belongingness_matrix
 
     def apply_belongingness_patch(self):
@@ -214,10 +276,15 @@ class GlycomeModel(LaplacianSmoothingModel):
     def sample_tau(self, rho, lmda):
         sigma_est = np.std(self.S0)
         mu_tau = self.estimate_tau_from_S0(rho, lmda)
-        return np.random.multivariate_normal(mu_tau, np.eye(len(mu_tau)).dot(sigma_est ** 2))
+        # The covariance is isotropic, so scale independent draws rather than
+        # factorizing a diagonal covariance matrix.
+        return mu_tau + sigma_est * np.random.standard_normal(len(mu_tau))
 
     def sample_phi_given_tau(self, tau, lmda):
-        return np.random.multivariate_normal(self.A0.dot(tau), (1. / lmda) * self.L_oo_inv)
+        # Draw from N(A0 tau, L_oo_inv / lmda) through the cached Cholesky factor
+        # of the Schur complement instead of decomposing the covariance per call.
+        z = np.random.standard_normal(len(self.S0))
+        return self.A0.dot(tau) + self.block_L.apply_oo_inv_sqrt(z) / np.sqrt(lmda)
 
     def find_optimal_lambda(self, rho, lambda_max=1, step=0.01, threshold=0.0001, fit_tau=True,
                             drop_missing=True, renormalize_belongingness=NORMALIZATION):
@@ -230,7 +297,6 @@ class GlycomeModel(LaplacianSmoothingModel):
             else:
                 obs.append(node.score)
         lambda_values = np.arange(0.01, lambda_max, step)
-        press = []
         if drop_missing:
             for node in missed:
                 network.remove_node(node, limit=5)
@@ -239,19 +305,26 @@ class GlycomeModel(LaplacianSmoothingModel):
             network, self.normalized_belongingness_matrix, threshold,
             neighborhood_walker=self.neighborhood_walker,
             belongingness_normalization=renormalize_belongingness)
-        ident = np.eye(wpl.shape[0])
-        for lambd in lambda_values:
-            if fit_tau:
-                tau = lum.estimate_tau_from_S0(rho, lambd)
-            else:
-                tau = np.zeros(self.A0.shape[1])
-            T = lum.optimize_observed_scores(lambd, lum.A0.dot(tau))
-            A = ident + lambd * wpl
-            H = np.linalg.inv(A)
-            press_value = sum(
-                ((obs - T) / (1 - (np.diag(H) - np.finfo(float).eps))) ** 2) / len(obs)
-            press.append(press_value)
-        return lambda_values, np.array(press)
+        press, _, _ = self._evaluate_lambda_sweep(
+            lum, np.array(obs), lambda_values, np.linalg.eigh(wpl), rho, fit_tau)
+        return lambda_values, press
+
+    def _evaluate_lambda_sweep(self, lum, observed, lambda_values, laplacian_spectrum, rho,
+                               fit_tau=True, indices=None):
+        if fit_tau:
+            taus = [lum.estimate_tau_from_S0(rho, lambd) for lambd in lambda_values]
+        else:
+            taus = [np.zeros(self.A0.shape[1]) for lambd in lambda_values]
+        t0 = lum.A0.dot(np.array(taus).T)
+        updates = lum.optimize_observed_scores_over(lambda_values, t0)
+        # 1 - diag(H), where H = (I + lambda * L)^-1 is the smoothing hat matrix
+        leverage_complement = _hat_diagonal_complements(
+            laplacian_spectrum, lambda_values, indices).T
+        assert leverage_complement.shape == updates.shape
+        press = np.sum((
+            (observed - updates) / (leverage_complement + np.finfo(float).eps)) ** 2,
+            axis=1) / len(observed)
+        return press, list(updates), taus
 
     def find_threshold_and_lambda(self, rho, lambda_max=1., lambda_step=0.01, threshold_start=0.,
                                   threshold_step=0.2, fit_tau=True, drop_missing=True,
@@ -260,11 +333,11 @@ class GlycomeModel(LaplacianSmoothingModel):
         limit = max(self.S0)
         start = max(min(self.S0), threshold_start)
         current_network = self.network.clone()
+        wpl = None
         for threshold in np.arange(start, limit, threshold_step):
             obs = []
             missed = []
-            network = current_network.clone()
-            for i, node in enumerate(network):
+            for i, node in enumerate(current_network):
                 if node.score < threshold:
                     missed.append(node)
                 else:
@@ -273,39 +346,29 @@ class GlycomeModel(LaplacianSmoothingModel):
                 break
             obs = np.array(obs)
             lambda_values = np.arange(0.01, lambda_max, lambda_step)
-            press = []
-            if drop_missing:
+            network = current_network
+            # Successive thresholds often remove no further nodes, in which case
+            # the previous network and its Laplacian are reused unchanged. When
+            # nodes are removed, their neighbors may be bridged by new edges, so
+            # the Laplacian must be rebuilt rather than sliced.
+            if drop_missing and missed:
+                network = current_network.clone()
                 for node in missed:
                     network.remove_node(node, limit=5)
-            wpl = weighted_laplacian_matrix(network)
-            ident = np.eye(wpl.shape[0])
+                wpl = None
+            if wpl is None:
+                wpl = weighted_laplacian_matrix(network)
+                spectrum = np.linalg.eigh(wpl)
             lum = LaplacianSmoothingModel(
                 network, self.normalized_belongingness_matrix, threshold,
                 neighborhood_walker=self.neighborhood_walker,
                 belongingness_normalization=renormalize_belongingness)
-            updates = []
-            taus = []
-            for lambd in lambda_values:
-                if fit_tau:
-                    tau = lum.estimate_tau_from_S0(rho, lambd)
-                else:
-                    tau = np.zeros(self.A0.shape[1])
-                T = lum.optimize_observed_scores(lambd, lum.A0.dot(tau))
-                A = ident + lambd * wpl
-
-                H = np.linalg.inv(A)
-                diag_H = np.diag(H)
-                if len(diag_H) != len(T):
-                    diag_H = diag_H[lum.obs_ix]
-                    assert len(diag_H) == len(T)
-
-                press_value = sum(
-                    ((obs - T) / (1 - (diag_H - np.finfo(float).eps))) ** 2) / len(obs)
-                press.append(press_value)
-                updates.append(T)
-                taus.append(tau)
+            # Only the entries of the hat matrix's diagonal belonging to
+            # observed nodes enter the PRESS statistic.
+            press, updates, taus = self._evaluate_lambda_sweep(
+                lum, obs, lambda_values, spectrum, rho, fit_tau, lum.obs_ix)
             solutions[threshold] = NetworkTrimmingSearchSolution(
-                threshold, lambda_values, np.array(press), (network), np.array(obs),
+                threshold, lambda_values, press, (network), np.array(obs),
                 updates, taus, lum)
             current_network = network
         return solutions
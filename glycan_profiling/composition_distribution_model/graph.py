@@ -1,48 +1,101 @@
 import numpy as np
 from scipy import linalg
+from scipy import sparse as sp
 
 from .constants import DEFAULT_LAPLACIAN_REGULARIZATION
 
 
-def adjacency_matrix(network):
-    A = np.zeros((len(network), len(network)))
+def _symmetric_edge_matrix(network, weight_fn):
+    n = len(network)
+    rows = []
+    cols = []
+    data = []
     for edge in network.edges:
         i, j = edge.node1.index, edge.node2.index
-        A[i, j] = 1
-        A[j, i] = 1
-    for i in range(A.shape[0]):
-        A[i, i] = 0
-    return A
+        if i == j:
+            continue
+        weight = weight_fn(edge)
+        rows.append(i)
+        cols.append(j)
+        data.append(weight)
+        rows.append(j)
+        cols.append(i)
+        data.append(weight)
+    return sp.csr_matrix((data, (rows, cols)), shape=(n, n), dtype=np.float64)
 
 
-def weighted_adjacency_matrix(network):
-    A = np.zeros((len(network), len(network)))
-    A[:] = 1. / float('inf')
-    for edge in network.edges:
-        i, j = edge.node1.index, edge.node2.index
-        A[i, j] = 1. / edge.order
-        A[j, i] = 1. / edge.order
-    for i in range(A.shape[0]):
-        A[i, i] = 0
-    return A
+def _as_requested(matrix, sparse):
+    if sparse:
+        return matrix.tocsr()
+    return matrix.toarray()
+
 
+def adjacency_matrix(network, sparse=False):
+    A = _symmetric_edge_matrix(network, lambda edge: 1.0)
+    return _as_requested(A, sparse)
 
-def degree_matrix(network):
+
+def weighted_adjacency_matrix(network, sparse=False):
+    A = _symmetric_edge_matrix(network, lambda edge: 1. / edge.order)
+    return _as_requested(A, sparse)
+
+
+def degree_matrix(network, sparse=False):
     degrees = [len(n.edges) for n in network]
-    return np.diag(degrees)
+    return _as_requested(sp.diags(np.array(degrees, dtype=np.float64)), sparse)
 
 
-def weighted_degree_matrix(network):
+def weighted_degree_matrix(network, sparse=False):
     degrees = [sum(1. / e.order for e in n.edges) for n in network]
-    return np.diag(degrees)
+    return _as_requested(sp.diags(np.array(degrees, dtype=np.float64)), sparse)
+
 
+def laplacian_matrix(network, sparse=False):
+    L = degree_matrix(network, sparse=True) - adjacency_matrix(network, sparse=True)
+    return _as_requested(L, sparse)
 
-def laplacian_matrix(network):
-    return degree_matrix(network) - adjacency_matrix(network)
 
+def weighted_laplacian_matrix(network, sparse=False):
+    return build_weighted_laplacian(network, 0.0, sparse=sparse)
 
-def weighted_laplacian_matrix(network):
-    return weighted_degree_matrix(network) - weighted_adjacency_matrix(network)
+
+def build_weighted_laplacian(network, regularize=0.0, sparse=True):
+    """Build the weighted Laplacian of `network`, with `regularize` added along
+    its diagonal, from a single set of coordinate triplets rather than by
+    subtracting a separately built adjacency matrix from a degree matrix.
+
+    Parameters
+    ----------
+    network : CompositionGraph
+        The network to build the Laplacian of
+    regularize : float, optional
+        A constant to add to every diagonal entry
+    sparse : bool, optional
+        Whether to return a :class:`scipy.sparse.csr_matrix` instead of a
+        dense array
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix or np.ndarray
+    """
+    n = len(network)
+    rows = []
+    cols = []
+    data = []
+    for edge in network.edges:
+        i, j = edge.node1.index, edge.node2.index
+        if i == j:
+            continue
+        weight = -1. / edge.order
+        rows.extend((i, j))
+        cols.extend((j, i))
+        data.extend((weight, weight))
+    for node in network:
+        rows.append(node.index)
+        cols.append(node.index)
+        data.append(sum(1. / e.order for e in node.edges) + regularize)
+    L = sp.coo_matrix((data, (rows, cols)), shape=(n, n), dtype=np.float64)
+    return _as_requested(L, sparse)
 
 
 def assign_network(network, observed, copy=True):
@@ -86,14 +139,20 @@ def make_blocks(network, observed, threshold=0.0001, regularize=DEFAULT_LAPLACIA
     return BlockLaplacian(network, threshold, regularize)
 
 
-def _reference_compute_missing_scores(blocks, observed_scores, t0=0., tm=0.):
-    return -linalg.inv(blocks['mm']).dot(blocks['mo']).dot(observed_scores - t0) + tm
+def _reference_compute_missing_scores(blocks, observed_scores, t0=0., tm=0., L_mm_inv=None):
+    if L_mm_inv is None:
+        L_mm_inv = getattr(blocks, "L_mm_inv", None)
+    if L_mm_inv is None:
+        L_mm_inv = linalg.inv(blocks['mm'])
+    return -L_mm_inv.dot(blocks['mo']).dot(observed_scores - t0) + tm
 
 
-def _reference_optimize_observed_scores(blocks, lmbda, observed_scores, t0=0.):
-    S = lmbda * (blocks["oo"] - blocks["om"].dot(linalg.inv(
-                 blocks['mm'])).dot(blocks["mo"]))
-    B = np.eye(len(observed_scores)) + S
+def _reference_optimize_observed_scores(blocks, lmbda, observed_scores, t0=0., schur=None):
+    if schur is None:
+        schur = getattr(blocks, "schur_oo", None)
+    if schur is None:
+        schur = blocks["oo"] - blocks["om"].dot(linalg.inv(blocks['mm'])).dot(blocks["mo"])
+    B = np.eye(len(observed_scores)) + lmbda * schur
     return linalg.inv(B).dot(observed_scores - t0) + t0
 
 
@@ -112,9 +171,7 @@ class BlockLaplacian(object):
             self._build_from_network(network)
 
     def _build_from_network(self, network):
-        structure_matrix = weighted_laplacian_matrix(network)
-        structure_matrix = structure_matrix + (np.eye(
-            structure_matrix.shape[0]) * self.regularize)
+        structure_matrix = build_weighted_laplacian(network, self.regularize, sparse=True)
         observed_indices, missing_indices = network_indices(network, self.threshold)
 
         self.obs_ix = observed_indices
@@ -123,15 +180,135 @@ class BlockLaplacian(object):
         self.matrix = structure_matrix
         self.blocks = self._blocks_from(structure_matrix)
 
-        self.L_mm_inv = np.linalg.inv(self['mm'])
-        self.L_oo_inv = np.linalg.pinv(
-            self["oo"] - (self['om'].dot(self.L_mm_inv).dot(self['mo'])))
+        self._L_mm_inv = None
+        self._mm_cho = self._factor(self['mm'])
+        # The Schur complement of the missing block depends only on the network
+        # and the threshold, so it is computed once here and shared by every
+        # lambda evaluated against this partition.
+        self.schur_oo = self["oo"] - self['om'].dot(self.apply_mm_inv(self['mo']))
+        self._L_oo_inv = None
+        self._oo_cho = self._factor(self.schur_oo)
+        self._schur_eigh = None
+
+    @staticmethod
+    def _factor(matrix):
+        # The regularized Laplacian is symmetric positive definite, so its
+        # diagonal blocks admit a Cholesky factorization which can be reused
+        # for every right hand side. Returns None when the block is empty or
+        # not positive definite.
+        if matrix.shape[0] == 0:
+            return None
+        try:
+            return linalg.cho_factor(matrix, check_finite=False)
+        except linalg.LinAlgError:
+            return None
+
+    @property
+    def L_mm_inv(self):
+        if self._L_mm_inv is None:
+            if self._mm_cho is not None:
+                self._L_mm_inv = linalg.cho_solve(
+                    self._mm_cho, np.eye(self['mm'].shape[0]), check_finite=False)
+            else:
+                self._L_mm_inv = np.linalg.inv(self['mm'])
+        return self._L_mm_inv
+
+    def apply_mm_inv(self, x):
+        """Compute :math:`L_{mm}^{-1}x` without forming the inverse.
+
+        Parameters
+        ----------
+        x : np.ndarray
+            A vector or matrix with as many rows as there are missing nodes
+
+        Returns
+        -------
+        np.ndarray
+        """
+        if self._mm_cho is None:
+            return self.L_mm_inv.dot(x)
+        return linalg.cho_solve(self._mm_cho, x, check_finite=False)
+
+    @property
+    def L_oo_inv(self):
+        if self._L_oo_inv is None:
+            if self._oo_cho is not None:
+                self._L_oo_inv = linalg.cho_solve(
+                    self._oo_cho, np.eye(self.schur_oo.shape[0]), check_finite=False)
+            else:
+                self._L_oo_inv = np.linalg.pinv(self.schur_oo)
+        return self._L_oo_inv
+
+    def apply_oo_inv_sqrt(self, x):
+        """Compute :math:`R^{-1}x`, where :math:`S_{oo} = R^TR` is the Cholesky
+        factorization of the Schur complement of the missing block.
+
+        If `x` is drawn from a standard normal distribution, the result is
+        normally distributed with covariance :math:`S_{oo}^{-1}`. When
+        :math:`S_{oo}` is not positive definite, the symmetric square root of
+        its pseudo-inverse is used instead.
+
+        Parameters
+        ----------
+        x : np.ndarray
+            A vector or matrix with as many rows as there are observed nodes
+
+        Returns
+        -------
+        np.ndarray
+        """
+        if self._oo_cho is None:
+            eigenvalues, eigenvectors = np.linalg.eigh(self.L_oo_inv)
+            root = eigenvectors * np.sqrt(np.maximum(eigenvalues, 0))
+            return root.dot(x)
+        factor, lower = self._oo_cho
+        return linalg.solve_triangular(
+            factor, x, lower=lower, trans='T' if lower else 'N', check_finite=False)
+
+    def schur_eigh(self):
+        """The eigendecomposition of the Schur complement :math:`S_{oo}`,
+        computed once and cached.
+
+        Returns
+        -------
+        eigenvalues : np.ndarray
+        eigenvectors : np.ndarray
+        """
+        if self._schur_eigh is None:
+            self._schur_eigh = np.linalg.eigh(self.schur_oo)
+        return self._schur_eigh
+
+    def apply_oo_inv(self, x):
+        """Compute :math:`S_{oo}^{-1}x`, where :math:`S_{oo}` is the Schur
+        complement of the missing block, without forming the inverse.
+
+        Falls back to the pseudo-inverse when :math:`S_{oo}` is not positive
+        definite.
+
+        Parameters
+        ----------
+        x : np.ndarray
+            A vector or matrix with as many rows as there are observed nodes
+
+        Returns
+        -------
+        np.ndarray
+        """
+        if self._oo_cho is None:
+            return self.L_oo_inv.dot(x)
+        return linalg.cho_solve(self._oo_cho, x, check_finite=False)
 
     def _blocks_from(self, matrix):
-        oo_block = matrix[self.obs_ix, :][:, self.obs_ix]
-        om_block = matrix[self.obs_ix, :][:, self.miss_ix]
-        mo_block = matrix[self.miss_ix, :][:, self.obs_ix]
-        mm_block = matrix[self.miss_ix, :][:, self.miss_ix]
+        # The full Laplacian is kept sparse, only the blocks consumed by the
+        # dense solvers are materialized. Row slices of a CSR matrix are cheap
+        # and each is shared by two blocks, and since the Laplacian is symmetric
+        # the mo block is just the transpose of the om block.
+        obs_rows = matrix[self.obs_ix, :]
+        miss_rows = matrix[self.miss_ix, :]
+        oo_block = obs_rows[:, self.obs_ix].toarray()
+        om_block = obs_rows[:, self.miss_ix].toarray()
+        mo_block = np.ascontiguousarray(om_block.T)
+        mm_block = miss_rows[:, self.miss_ix].toarray()
         return {"oo": oo_block, "om": om_block, "mo": mo_block, "mm": mm_block}
 
     def __getitem__(self, k):
@@ -1,4 +1,5 @@
 from collections import OrderedDict, namedtuple
+from bisect import bisect_left, insort
 import re
 
 import numpy as np
@@ -15,6 +16,7 @@ class NetworkReduction(object):
         if store is None:
             store = OrderedDict()
         self.store = store
+        self._sorted_keys = sorted(self.store.keys())
 
     def getkey(self, key):
         return self.store[key]
@@ -23,13 +25,18 @@ class NetworkReduction(object):
         return self.getkey(list(self.store.keys())[ix])
 
     def searchkey(self, value):
-        array = list(self.store.keys())
-        ix = self.binsearch(array, value)
-        key = array[ix]
+        keys = self._sorted_keys
+        ix = bisect_left(keys, value)
+        # The nearest key may lie on either side of the insertion point
+        if ix == len(keys) or (ix > 0 and value - keys[ix - 1] < keys[ix] - value):
+            ix -= 1
+        key = keys[ix]
         assert abs(value - key) < 1e-3
         return self.getkey(key)
 
     def put(self, key, value):
+        if key not in self.store:
+            insort(self._sorted_keys, key)
         self.store[key] = value
 
     def __getitem__(self, key):
@@ -41,23 +48,6 @@ class NetworkReduction(object):
     def __iter__(self):
         return iter(self.store.values())
 
-    @staticmethod
-    def binsearch(array, value):
-        lo = 0
-        hi = len(array) - 1
-        while hi - lo:
-            i = (hi + lo) / 2
-            x = array[i]
-            if x == value:
-                return i
-            elif hi - lo == 1:
-                return i
-            elif x < value:
-                lo = i
-            elif x > value:
-                hi = i
-        return i
-
     def plot(self, ax=None, **kwargs):
         if ax is None:
             fig, ax = plt.subplots(1)
@@ -1,5 +1,7 @@
 from collections import namedtuple, OrderedDict
 
+from six import string_types as basestring
+
 import numpy as np
 from scipy import linalg
 
@@ -11,7 +13,19 @@ from .constants import DEFAULT_LAPLACIAN_REGULARIZATION, NORMALIZATION
 from .graph import network_indices, BlockLaplacian
 
 
+def _solve_spd(A, b):
+    """Solve the symmetric positive definite system `A x = b`, falling back
+    to the pseudo-inverse when `A` turns out to be singular or indefinite.
+    """
+    try:
+        return linalg.solve(A, b, assume_a='pos', check_finite=False)
+    except linalg.LinAlgError:
+        return np.linalg.pinv(A).dot(b)
+
+
 class LaplacianSmoothingModel(object):
+    _A0_gram = None
+
     def __init__(self, network, belongingness_matrix, threshold,
                  regularize=DEFAULT_LAPLACIAN_REGULARIZATION, neighborhood_walker=None,
                  belongingness_normalization=NORMALIZATION):
@@ -51,36 +65,82 @@ class LaplacianSmoothingModel(object):
     def L_oo_inv(self):
         return self.block_L.L_oo_inv
 
+    @property
+    def schur_oo(self):
+        return self.block_L.schur_oo
+
     def optimize_observed_scores(self, lmda, t0=0):
-        blocks = self.block_L
-        L = lmda * (blocks["oo"] - blocks["om"].dot(self.L_mm_inv).dot(blocks["mo"]))
-        B = np.eye(len(self.S0)) + L
-        return np.linalg.inv(B).dot(self.S0 - t0) + t0
+        B = np.eye(len(self.S0)) + lmda * self.schur_oo
+        return _solve_spd(B, self.S0 - t0) + t0
+
+    def optimize_observed_scores_over(self, lambda_values, t0=0):
+        """Evaluate :meth:`optimize_observed_scores` for every value in
+        `lambda_values` at once.
+
+        Every system :math:`I + \\lambda S` shares the eigenvectors of the Schur
+        complement :math:`S`, so a single eigendecomposition of :math:`S` solves
+        all of them.
+
+        Parameters
+        ----------
+        lambda_values : np.ndarray
+            The smoothing factors to evaluate
+        t0 : float or np.ndarray
+            The offset, either shared by every lambda, or with one column
+            per lambda
+
+        Returns
+        -------
+        np.ndarray
+            One row of optimized scores per lambda
+        """
+        lambda_values = np.asarray(lambda_values, dtype=np.float64)
+        eigenvalues, eigenvectors = self.block_L.schur_eigh()
+        t0 = np.asarray(t0, dtype=np.float64)
+        if t0.ndim < 2:
+            t0 = np.broadcast_to(t0.reshape((-1, 1)), (len(self.S0), len(lambda_values)))
+        projected = eigenvectors.T.dot(np.reshape(self.S0, (-1, 1)) - t0)
+        projected /= 1. + np.outer(eigenvalues, lambda_values)
+        return (eigenvectors.dot(projected) + t0).T
 
     def compute_missing_scores(self, observed_scores, t0=0., tm=0.):
         blocks = self.block_L
-        return -linalg.inv(blocks['mm']).dot(blocks['mo']).dot(observed_scores - t0) + tm
+        return -blocks.apply_mm_inv(blocks['mo'].dot(observed_scores - t0)) + tm
 
     def compute_projection_matrix(self, lmbda):
-        A = np.eye(self.L_oo_inv.shape[0]) + self.L_oo_inv * (1. / lmbda)
-        H = np.linalg.pinv(A)
-        return H
+        if self.block_L._oo_cho is None:
+            A = np.eye(self.L_oo_inv.shape[0]) + self.L_oo_inv * (1. / lmbda)
+            return np.linalg.pinv(A)
+        # (I + S^-1 / lambda)^-1 == lambda (I + lambda S)^-1 S, which avoids
+        # inverting the Schur complement S at all.
+        S = self.schur_oo
+        B = np.eye(S.shape[0]) + lmbda * S
+        return lmbda * _solve_spd(B, S)
 
     def compute_press(self, observed, updated, projection_matrix):
         press = np.sum(((observed - updated) / (
             1 - (np.diag(projection_matrix) - np.finfo(float).eps))) ** 2) / len(observed)
         return press
 
+    def _belongingness_gram(self):
+        # A0 A0^T does not depend on lambda, so it is computed once per A0 rather
+        # than once per step of a lambda sweep. A0 is replaced, never modified
+        # in place, whenever the threshold or belongingness patch changes.
+        cache = self._A0_gram
+        if cache is None or cache[0] is not self.A0:
+            cache = self._A0_gram = (self.A0, self.A0.dot(self.A0.T))
+        return cache[1]
+
     def estimate_tau_from_S0(self, rho, lmda, sigma2=1.0):
         X = ((rho / sigma2) * self.variance_matrix) + (
-            (1. / (lmda * sigma2)) * self.L_oo_inv) + self.A0.dot(self.A0.T)
-        X = np.linalg.pinv(X)
-        return self.A0.T.dot(X).dot(self.S0)
+            (1. / (lmda * sigma2)) * self.L_oo_inv) + self._belongingness_gram()
+        return self.A0.T.dot(_solve_spd(X, self.S0))
 
     def get_belongingness_patch(self):
         updated_belongingness = BelongingnessMatrixPatcher.patch(self)
+        # The patched matrix is a fresh array, so it can be normalized in place
         updated_belongingness = ProportionMatrixNormalization.normalize(
-            updated_belongingness, self._belongingness_normalization)
+            updated_belongingness, self._belongingness_normalization, copy=False)
         return updated_belongingness
 
     def apply_belongingness_patch(self):
@@ -90,14 +150,20 @@ class LaplacianSmoothingModel(object):
 
 
 class ProportionMatrixNormalization(object):
-    def __init__(self, matrix):
-        self.matrix = np.array(matrix)
+    def __init__(self, matrix, copy=True):
+        if copy:
+            self.matrix = np.array(matrix, dtype=np.float64)
+        else:
+            self.matrix = np.asarray(matrix, dtype=np.float64)
 
     def normalize_columns(self):
-        self.matrix = self.matrix / self.matrix.sum(axis=0)
+        totals = self.matrix.sum(axis=0)
+        # Empty columns are left as zeros rather than being filled with NaN
+        np.divide(self.matrix, totals, out=self.matrix, where=totals != 0)
 
     def normalize_rows(self):
-        self.matrix = self.matrix / self.matrix.sum(axis=1).reshape((-1, 1))
+        totals = self.matrix.sum(axis=1).reshape((-1, 1))
+        np.divide(self.matrix, totals, out=self.matrix, where=totals != 0)
 
     def normalize_columns_and_rows(self):
         self.normalize_columns()
@@ -106,7 +172,7 @@ class ProportionMatrixNormalization(object):
 
     def normalize_columns_scaled(self, scaler=2.0):
         self.normalize_columns()
-        self.matrix = self.matrix * scaler
+        self.matrix *= scaler
 
     def clean(self):
         self.matrix[np.isnan(self.matrix)] = 0.0
@@ -115,8 +181,8 @@ class ProportionMatrixNormalization(object):
         return self.matrix
 
     @classmethod
-    def normalize(cls, matrix, method='colrow'):
-        self = cls(matrix)
+    def normalize(cls, matrix, method='colrow', copy=True):
+        self = cls(matrix, copy=copy)
         if method == 'col':
             self.normalize_columns()
         elif method == 'row':
@@ -244,16 +310,14 @@ class BelongingnessMatrixPatcher(object):
             model, normalized=False)
 
     def find_singleton_neighborhoods(self):
-        n_cols = self.A0.shape[1]
-        edits = []
-        for i in range(n_cols):
-            # We have a neighborhood with only one member
-            col = self.A0[:, i]
-            mask = col > 0
-            if mask.sum() == 1:
-                j = np.argmax(mask)
-                edit = MatrixEditIndex(j, i, 'delete')
-                edits.append(edit)
+        mask = self.A0 > 0
+        # Neighborhoods with only one member
+        singleton_columns = np.flatnonzero(mask.sum(axis=0) == 1)
+        member_rows = mask[:, singleton_columns].argmax(axis=0)
+        edits = [
+            MatrixEditIndex(int(j), int(i), 'delete')
+            for j, i in zip(member_rows, singleton_columns)
+        ]
         return edits
 
     def transform_index_to_key(self, edits):
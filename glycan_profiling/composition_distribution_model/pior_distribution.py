@@ -61,13 +61,47 @@ class CompositionDistributionUpdater(TaskBase):
         # Dirichlet Mean
         self.pi0 = self.prior / self.prior.sum()
 
-        self.sol_map = {
-            sol.composition: sol.score for sol in solutions if sol.composition is not None}
+        # Constant terms of the update step
+        self._prior_minus_1 = self.prior - 1.0
+        self._total_w = self._prior_minus_1.sum() + 1.0
 
-        self.observations = np.array(
-            [self.sol_map.get(node.composition.serialize(), 0) for node in network.nodes])
+        self.observations = self._join_observations(network, solutions)
         self.iterations = 0
 
+    @staticmethod
+    def _join_observations(network, solutions):
+        """Look up the score of each node's composition among `solutions`
+        by binary search over the sorted composition strings, rather than
+        with a Python-level dictionary lookup per node.
+
+        Returns
+        -------
+        np.ndarray
+        """
+        keys = []
+        scores = []
+        for sol in solutions:
+            if sol.composition is not None:
+                keys.append(sol.composition)
+                scores.append(sol.score)
+        # Nodes cache their serialized composition, so repeated fits against
+        # the same network do not re-serialize every node.
+        node_keys = np.array([node.serialize() for node in network.nodes], dtype=str)
+        if not keys or not len(node_keys):
+            return np.zeros(len(node_keys))
+        # When a composition is repeated, the last solution wins, so take the
+        # first occurrence of each key in reversed order.
+        keys, first = np.unique(np.array(keys[::-1], dtype=str), return_index=True)
+        scores = np.array(scores[::-1], dtype=np.float64)[first]
+        index = np.searchsorted(keys, node_keys)
+        np.minimum(index, len(keys) - 1, out=index)
+        return np.where(keys[index] == node_keys, scores[index], 0.0)
+
+    @property
+    def sol_map(self):
+        return {
+            sol.composition: sol.score for sol in self.solutions if sol.composition is not None}
+
     def index_of(self, composition):
         return self.network[composition].index
 
@@ -76,19 +110,25 @@ class CompositionDistributionUpdater(TaskBase):
         v = (np.abs(pi_next - pi_last).sum()) / d
         return v
 
-    def update_pi(self, pi_array):
-        pi2 = np.zeros_like(pi_array)
-        total_score_pi = (self.observations * pi_array).sum()
-        total_w = ((self.prior - 1).sum() + 1)
-        for i in range(len(self.prior)):
-            pi2[i] = ((self.prior[i] - 1) + (self.observations[i] *
-                                             pi_array[i]) / total_score_pi) / total_w
-            assert pi2[i] >= 0, (self.prior[i], pi_array[i])
-        return pi2
+    def update_pi(self, pi_array, out=None):
+        """Compute the next estimate of `pi` from `pi_array`, writing it
+        into `out` if given to avoid allocating a new array.
+        """
+        if out is None:
+            out = np.empty_like(pi_array)
+        total_score_pi = np.dot(self.observations, pi_array)
+        np.multiply(self.observations, pi_array, out=out)
+        out /= total_score_pi
+        out += self._prior_minus_1
+        out /= self._total_w
+        return out
 
     def optimize_pi(self, pi, maxiter=100, **kwargs):
-        pi_last = pi
+        # Alternate between two buffers so that no arrays are allocated
+        # while iterating
+        pi_last = np.array(pi, dtype=np.float64)
         pi_next = self.update_pi(pi_last)
+        delta = np.empty_like(pi_next)
 
         self.iterations = 0
         converging = float('inf')
@@ -96,9 +136,13 @@ class CompositionDistributionUpdater(TaskBase):
             self.iterations += 1
             if self.iterations % 100 == 0:
                 self.log("%f, %d" % (converging, self.iterations))
-            pi_last = pi_next
-            pi_next = self.update_pi(pi_last)
-            converging = self.convergence(pi_next, pi_last)
+            pi_last, pi_next = pi_next, pi_last
+            self.update_pi(pi_last, out=pi_next)
+            np.subtract(pi_next, pi_last, out=delta)
+            converging = np.abs(delta, out=delta).sum() / np.abs(pi_last).sum()
+        # A prior below 1 contributes a negative prior - 1 term, so an estimate
+        # can go negative. Only the final estimate is checked, not every iteration.
+        assert np.all(pi_next >= -1e-12), (self.prior, pi_next)
         if converging < self.etol:
             self.log("Converged in %d iterations" % self.iterations)
         else:
@@ -0,0 +1,94 @@
+cimport cython
+
+from itertools import combinations, islice
+
+from six.moves import intern
+
+from glypy import Composition
+from glypy.composition import formula
+from glypy.structure.glycan_composition import FrozenGlycanComposition
+
+
+cdef object _WATER = Composition("H2O")
+cdef double _WATER_MASS = _WATER.mass
+
+# Matches the default limit of `common.limiting_combinations`
+cdef Py_ssize_t _SITE_COMBINATION_LIMIT = 100
+
+
+cdef class GlycanCombinationRecord(object):
+    cdef:
+        public long id
+        public double calculated_mass
+        public object formula
+        public int count
+        public object glycan_composition_string
+        public object _parsed
+        public object _formula_composition
+        public object _water_loss
+
+    def __init__(self, combination):
+        self.id = combination.id
+        self.calculated_mass = combination.calculated_mass
+        self.formula = combination.formula
+        self.count = combination.count
+        self.glycan_composition_string = combination.composition
+        self._parsed = None
+        self._formula_composition = None
+        self._water_loss = None
+
+    cpdef object convert(self):
+        if self._parsed is None:
+            self._parsed = FrozenGlycanComposition.parse(self.glycan_composition_string)
+        gc = self._parsed.clone()
+        gc.id = self.id
+        gc.count = self.count
+        return gc
+
+    cpdef object formula_composition(self):
+        if self._formula_composition is None:
+            self._formula_composition = Composition(str(self.formula))
+        return self._formula_composition
+
+    cpdef object water_loss(self):
+        if self._water_loss is None:
+            self._water_loss = _WATER * self.count
+        return self._water_loss
+
+    def __repr__(self):
+        return "GlycanCombinationRecord(%d, %s)" % (
+            self.id, self.glycan_composition_string)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def glycosylate_sites(glycan_combination_partitions, peptide, peptide_composition, list unoccupied_sites,
+                      glycan_type, modification_name):
+    cdef:
+        Py_ssize_t i, n_sites
+        double peptide_mass, total_mass
+        GlycanCombinationRecord gc
+        object sequence, site, formula_string
+        tuple site_set
+        object peptide_id, protein_id, hypothesis_id
+
+    peptide_mass = peptide.calculated_mass
+    peptide_id = peptide.id
+    protein_id = peptide.protein_id
+    hypothesis_id = peptide.hypothesis_id
+    n_sites = len(unoccupied_sites)
+    for i in range(1, n_sites + 1):
+        for gc in glycan_combination_partitions[i, {glycan_type: i}]:
+            total_mass = peptide_mass + gc.calculated_mass - (gc.count * _WATER_MASS)
+            # Many glycopeptides share a formula. Interning lets the rows share one string,
+            # which pickle then writes only once per batch sent to the writer.
+            formula_string = intern(formula(peptide_composition + gc.formula_composition() - gc.water_loss()))
+
+            for site_set in islice(combinations(unoccupied_sites, i), _SITE_COMBINATION_LIMIT):
+                sequence = peptide.convert()
+                for site in site_set:
+                    sequence.add_modification(site, modification_name)
+                sequence.glycan = gc.convert()
+
+                yield (total_mass, formula_string, str(sequence),
+                       peptide_id, protein_id, hypothesis_id, gc.id)
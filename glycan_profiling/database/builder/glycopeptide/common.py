@@ -1,15 +1,21 @@
 import itertools
 from uuid import uuid4
-from collections import defaultdict, Counter
+from collections import defaultdict
 from multiprocessing import Process, Queue, Event, RLock
 from threading import Thread
-from itertools import product
 
 try:
     from Queue import Empty as QueueEmptyException
 except ImportError:
     from queue import Empty as QueueEmptyException
 
+try:
+    from faster_fifo import Queue as FasterFifoQueue
+except ImportError:
+    FasterFifoQueue = None
+
+from six.moves import intern
+
 from glypy import Composition
 from glypy.composition import formula
 from glypy.structure.glycan_composition import FrozenGlycanComposition
@@ -25,26 +31,67 @@ from glycan_profiling.task import TaskBase
 
 from glycan_profiling.database.builder.glycan import glycan_combinator
 from glycan_profiling.database.builder.base import HypothesisSerializerBase
+from glycan_profiling.database.builder.glycopeptide.proteomics.utils import slurp
 
 from glycopeptidepy.structure.sequence import (
     _n_glycosylation, _o_glycosylation, _gag_linker_glycosylation)
 
 
 _DEFAULT_GLYCAN_STEP_LIMIT = 15000
+_OUTPUT_QUEUE_SIZE_BYTES = 2 ** 26
 
+_WATER = Composition("H2O")
 
-def slurp(session, model, ids, flatten=True):
-    if flatten:
-        ids = [j for i in ids for j in i]
+
+glycopeptide_columns = (
+    'calculated_mass', 'formula', 'glycopeptide_sequence', 'peptide_id',
+    'protein_id', 'hypothesis_id', 'glycan_combination_id')
+
+
+def insert_glycopeptides(session, rows):
+    """Write glycopeptide rows, tuples ordered like :data:`glycopeptide_columns`,
+    with a single executemany ``INSERT``.
+    """
+    if rows:
+        session.execute(
+            Glycopeptide.__table__.insert(),
+            [dict(zip(glycopeptide_columns, row)) for row in rows])
+
+
+def iterslurp(session, model, ids, batch_size=900):
+    """Yield the instances of `model` whose ids are in `ids`, issuing one
+    ``IN`` query per `batch_size` ids instead of one query per id.
+
+    `batch_size` is kept under SQLite's default limit of 999 bound parameters.
+    """
     total = len(ids)
     last = 0
-    step = 100
-    results = []
     while last < total:
-        results.extend(session.query(model).filter(
-            model.id.in_(ids[last:last + step])))
-        last += step
-    return results
+        for instance in session.query(model).filter(
+                model.id.in_(ids[last:last + batch_size])).order_by(model.id):
+            yield instance
+        last += batch_size
+
+
+def iterpages(query, model, page_size=100):
+    """Yield the instances matched by `query` in order of `model.id`, reading
+    `page_size` rows at a time.
+
+    Each page is selected by keyset on ``model.id`` and read in full before any
+    of it is yielded, so unlike :meth:`~sqlalchemy.orm.Query.yield_per` the
+    session may commit between rows without disturbing an open cursor.
+    """
+    last_id = None
+    while True:
+        page_query = query
+        if last_id is not None:
+            page_query = page_query.filter(model.id > last_id)
+        page = page_query.order_by(model.id).limit(page_size).all()
+        if not page:
+            break
+        last_id = page[-1].id
+        for instance in page:
+            yield instance
 
 
 class GlycopeptideHypothesisSerializerBase(DatabaseBoundOperation, HypothesisSerializerBase):
@@ -124,12 +171,12 @@ class GlycopeptideHypothesisDestroyer(DatabaseBoundOperation, TaskBase):
 
     def delete_peptides(self):
         self.log("Delete Peptides")
-        q = self.session.query(Protein.id).filter(Protein.hypothesis_id == self.hypothesis_id)
-        for protein_id, in q:
-            self.session.query(Peptide).filter(
-                Peptide.protein_id == protein_id).delete(
-                synchronize_session=False)
-            self.session.commit()
+        protein_ids = self.session.query(Protein.id).filter(
+            Protein.hypothesis_id == self.hypothesis_id).subquery()
+        self.session.query(Peptide).filter(
+            Peptide.protein_id.in_(protein_ids)).delete(
+            synchronize_session=False)
+        self.session.commit()
 
     def delete_protein(self):
         self.log("Delete Protein")
@@ -182,31 +229,73 @@ def combination_structure_class_map(session, hypothesis_id, composition_class_ma
     return mapping
 
 
+def _class_key_table():
+    return defaultdict(list)
+
+
 class GlycanCombinationPartitionTable(TaskBase):
+    """Index glycan combinations by their size and the number of glycans of each
+    structure class they contain.
+
+    The table does not retain the :class:`Session` it was built from, so when it is
+    populated with :class:`GlycanCombinationRecord` instances it may be built once
+    and handed to worker processes.
+    """
     def __init__(self, session, glycan_combinations, glycan_classes, hypothesis):
-        self.session = session
-        self.tables = defaultdict(lambda: defaultdict(list))
+        self.tables = defaultdict(_class_key_table)
         self.hypothesis_id = hypothesis.id
         self.glycan_hypothesis_id = hypothesis.glycan_hypothesis_id
         self.glycan_classes = glycan_classes
-        self.build_table(glycan_combinations)
+        self.build_table(session, glycan_combinations)
 
-    def build_table(self, glycan_combinations):
+    def build_table(self, session, glycan_combinations):
         composition_class_map = composition_to_structure_class_map(
-            self.session, self.glycan_hypothesis_id)
+            session, self.glycan_hypothesis_id)
         combination_class_map = combination_structure_class_map(
-            self.session, self.hypothesis_id, composition_class_map)
+            session, self.hypothesis_id, composition_class_map)
 
+        key_cache = {}
         for entry in glycan_combinations:
             size_table = self.tables[entry.count]
-            component_classes = combination_class_map[entry.id]
-            class_assignment_generator = product(*component_classes)
-            for classes in class_assignment_generator:
-                counts = Counter(c for c in classes)
-                key = tuple(counts[c] for c in self.glycan_classes)
+            component_classes = tuple(map(tuple, combination_class_map[entry.id]))
+            try:
+                keys = key_cache[component_classes]
+            except KeyError:
+                keys = key_cache[component_classes] = self.class_count_keys(component_classes)
+            for key in keys:
                 class_table = size_table[key]
                 class_table.append(entry)
 
+    def class_count_keys(self, component_classes):
+        """Enumerate the distinct counts of glycans in each of :attr:`glycan_classes`
+        that a combination's components can be assigned to.
+
+        Rather than building a count for every assignment of classes to components,
+        this extends the set of reachable counts by one component at a time.
+
+        Parameters
+        ----------
+        component_classes : Sequence of Sequence of str
+            The structure classes each component of the combination may belong to
+
+        Returns
+        -------
+        list of tuple
+        """
+        class_index = {c: i for i, c in enumerate(self.glycan_classes)}
+        keys = {(0,) * len(self.glycan_classes)}
+        for classes in component_classes:
+            indices = set(class_index.get(c) for c in classes)
+            next_keys = set()
+            for key in keys:
+                for i in indices:
+                    if i is None:
+                        next_keys.add(key)
+                    else:
+                        next_keys.add(key[:i] + (key[i] + 1,) + key[i + 1:])
+            keys = next_keys
+        return sorted(keys)
+
     def build_key(self, mapping):
         return tuple(mapping.get(c, 0) for c in self.glycan_classes)
 
@@ -219,17 +308,17 @@ class GlycanCombinationPartitionTable(TaskBase):
         return self.get_entries(size, mapping)
 
 
+def _free_sites(sequence, sites):
+    return [site for site in sites if not sequence[site][1]]
+
+
 def limiting_combinations(iterable, n, limit=100):
-    i = 0
-    for result in itertools.combinations(iterable, n):
-        i += 1
-        yield result
-        if i > limit:
-            break
+    return itertools.islice(itertools.combinations(iterable, n), limit)
 
 
 class GlycanCombinationRecord(object):
-    __slots__ = ['id', 'calculated_mass', 'formula', 'count', 'glycan_composition_string']
+    __slots__ = ['id', 'calculated_mass', 'formula', 'count', 'glycan_composition_string', '_parsed',
+                 '_formula_composition', '_water_loss']
 
     def __init__(self, combination):
         self.id = combination.id
@@ -237,20 +326,71 @@ class GlycanCombinationRecord(object):
         self.formula = combination.formula
         self.count = combination.count
         self.glycan_composition_string = combination.composition
+        self._parsed = None
+        self._formula_composition = None
+        self._water_loss = None
 
     def convert(self):
-        gc = FrozenGlycanComposition.parse(self.glycan_composition_string)
+        # Parse the composition text once, and hand out copies so that callers
+        # which modify the result cannot alter the cached instance.
+        if self._parsed is None:
+            self._parsed = FrozenGlycanComposition.parse(self.glycan_composition_string)
+        gc = self._parsed.clone()
         gc.id = self.id
         gc.count = self.count
         return gc
 
+    def formula_composition(self):
+        if self._formula_composition is None:
+            self._formula_composition = Composition(str(self.formula))
+        return self._formula_composition
+
+    def water_loss(self):
+        if self._water_loss is None:
+            self._water_loss = _WATER * self.count
+        return self._water_loss
+
     def __repr__(self):
         return "GlycanCombinationRecord(%d, %s)" % (
             self.id, self.glycan_composition_string)
 
 
+def glycosylate_sites(glycan_combination_partitions, peptide, peptide_composition, unoccupied_sites,
+                      glycan_type, modification_name):
+    water_mass = _WATER.mass
+    peptide_mass = peptide.calculated_mass
+    for i in range(len(unoccupied_sites)):
+        i += 1
+        for gc in glycan_combination_partitions[i, {glycan_type: i}]:
+            total_mass = peptide_mass + gc.calculated_mass - (gc.count * water_mass)
+            # Many glycopeptides share a formula. Interning lets the rows share one string,
+            # which pickle then writes only once per batch sent to the writer.
+            formula_string = intern(formula(peptide_composition + gc.formula_composition() - gc.water_loss()))
+
+            for site_set in limiting_combinations(unoccupied_sites, i):
+                sequence = peptide.convert()
+                for site in site_set:
+                    sequence.add_modification(site, modification_name)
+                sequence.glycan = gc.convert()
+
+                glycopeptide_sequence = str(sequence)
+
+                glycopeptide = (
+                    total_mass, formula_string, glycopeptide_sequence,
+                    peptide.id, peptide.protein_id, peptide.hypothesis_id,
+                    gc.id)
+                yield glycopeptide
+
+
+try:
+    from ._glycosylate import GlycanCombinationRecord, glycosylate_sites
+except ImportError:
+    pass
+
+
 class PeptideGlycosylator(object):
-    def __init__(self, session, hypothesis_id, glycan_offset=None, glycan_limit=_DEFAULT_GLYCAN_STEP_LIMIT):
+    def __init__(self, session, hypothesis_id, glycan_offset=None, glycan_limit=_DEFAULT_GLYCAN_STEP_LIMIT,
+                 glycan_combination_partitions=None):
         self.session = session
 
         self.glycan_offset = glycan_offset
@@ -260,7 +400,10 @@ class PeptideGlycosylator(object):
         self.hypothesis = self.session.query(GlycopeptideHypothesis).get(hypothesis_id)
         self.total_combinations = self._get_total_combination_count()
 
-        self.build_glycan_table(self.glycan_offset)
+        if glycan_combination_partitions is None:
+            self.build_glycan_table(self.glycan_offset)
+        else:
+            self.glycan_combination_partitions = glycan_combination_partitions
 
     def _get_total_combination_count(self):
         count = self.session.query(
@@ -283,6 +426,7 @@ class PeptideGlycosylator(object):
                 GlycanCombination).filter(
                 GlycanCombination.hypothesis_id == self.hypothesis_id).offset(
                 self.glycan_offset).limit(self.glycan_limit).all()
+            glycan_combinations = [GlycanCombinationRecord(gc) for gc in glycan_combinations]
         return glycan_combinations
 
     def _build_size_table(self, glycan_combinations):
@@ -296,97 +440,24 @@ class PeptideGlycosylator(object):
         self._build_size_table(glycan_combinations)
 
     def handle_peptide(self, peptide):
-        water = Composition("H2O")
+        """Generate the glycopeptides of `peptide` as plain tuples ordered
+        like :data:`glycopeptide_columns`, which are cheap to send between
+        processes and are written by :func:`insert_glycopeptides`.
+        """
         peptide_composition = Composition(str(peptide.formula))
         obj = peptide.convert()
 
-        # Handle N-linked glycosylation sites
-
-        n_glycosylation_unoccupied_sites = set(peptide.n_glycosylation_sites)
-        for site in list(n_glycosylation_unoccupied_sites):
-            if obj[site][1]:
-                n_glycosylation_unoccupied_sites.remove(site)
-        for i in range(len(n_glycosylation_unoccupied_sites)):
-            i += 1
-            for gc in self.glycan_combination_partitions[i, {GlycanTypes.n_glycan: i}]:
-                total_mass = peptide.calculated_mass + gc.calculated_mass - (gc.count * water.mass)
-                formula_string = formula(peptide_composition + Composition(str(gc.formula)) - (water * gc.count))
-
-                for site_set in limiting_combinations(n_glycosylation_unoccupied_sites, i):
-                    sequence = peptide.convert()
-                    for site in site_set:
-                        sequence.add_modification(site, _n_glycosylation.name)
-                    sequence.glycan = gc.convert()
-
-                    glycopeptide_sequence = str(sequence)
-
-                    glycopeptide = Glycopeptide(
-                        calculated_mass=total_mass,
-                        formula=formula_string,
-                        glycopeptide_sequence=glycopeptide_sequence,
-                        peptide_id=peptide.id,
-                        protein_id=peptide.protein_id,
-                        hypothesis_id=peptide.hypothesis_id,
-                        glycan_combination_id=gc.id)
-                    yield glycopeptide
-
-        # Handle O-linked glycosylation sites
-        o_glycosylation_unoccupied_sites = set(peptide.o_glycosylation_sites)
-        for site in list(o_glycosylation_unoccupied_sites):
-            if obj[site][1]:
-                o_glycosylation_unoccupied_sites.remove(site)
-
-        for i in range(len(o_glycosylation_unoccupied_sites)):
-            i += 1
-            for gc in self.glycan_combination_partitions[i, {GlycanTypes.o_glycan: i}]:
-                total_mass = peptide.calculated_mass + gc.calculated_mass - (gc.count * water.mass)
-                formula_string = formula(peptide_composition + Composition(str(gc.formula)) - (water * gc.count))
-
-                for site_set in limiting_combinations(o_glycosylation_unoccupied_sites, i):
-                    sequence = peptide.convert()
-                    for site in site_set:
-                        sequence.add_modification(site, _o_glycosylation.name)
-                    sequence.glycan = gc.convert()
-
-                    glycopeptide_sequence = str(sequence)
-
-                    glycopeptide = Glycopeptide(
-                        calculated_mass=total_mass,
-                        formula=formula_string,
-                        glycopeptide_sequence=glycopeptide_sequence,
-                        peptide_id=peptide.id,
-                        protein_id=peptide.protein_id,
-                        hypothesis_id=peptide.hypothesis_id,
-                        glycan_combination_id=gc.id)
-                    yield glycopeptide
-
-        # Handle GAG glycosylation sites
-        gag_unoccupied_sites = set(peptide.gagylation_sites)
-        for site in list(gag_unoccupied_sites):
-            if obj[site][1]:
-                gag_unoccupied_sites.remove(site)
-        for i in range(len(gag_unoccupied_sites)):
-            i += 1
-            for gc in self.glycan_combination_partitions[i, {GlycanTypes.gag_linker: i}]:
-                total_mass = peptide.calculated_mass + gc.calculated_mass - (gc.count * water.mass)
-                formula_string = formula(peptide_composition + Composition(str(gc.formula)) - (water * gc.count))
-                for site_set in limiting_combinations(gag_unoccupied_sites, i):
-                    sequence = peptide.convert()
-                    for site in site_set:
-                        sequence.add_modification(site, _gag_linker_glycosylation.name)
-                    sequence.glycan = gc.convert()
-
-                    glycopeptide_sequence = str(sequence)
-
-                    glycopeptide = Glycopeptide(
-                        calculated_mass=total_mass,
-                        formula=formula_string,
-                        glycopeptide_sequence=glycopeptide_sequence,
-                        peptide_id=peptide.id,
-                        protein_id=peptide.protein_id,
-                        hypothesis_id=peptide.hypothesis_id,
-                        glycan_combination_id=gc.id)
-                    yield glycopeptide
+        site_types = [
+            (peptide.n_glycosylation_sites, GlycanTypes.n_glycan, _n_glycosylation.name),
+            (peptide.o_glycosylation_sites, GlycanTypes.o_glycan, _o_glycosylation.name),
+            (peptide.gagylation_sites, GlycanTypes.gag_linker, _gag_linker_glycosylation.name),
+        ]
+        for sites, glycan_type, modification_name in site_types:
+            unoccupied_sites = _free_sites(obj, sites)
+            for glycopeptide in glycosylate_sites(
+                    self.glycan_combination_partitions, peptide, peptide_composition,
+                    unoccupied_sites, glycan_type, modification_name):
+                yield glycopeptide
 
 
 def null_log_handler(msg):
@@ -396,7 +467,7 @@ def null_log_handler(msg):
 class PeptideGlycosylatingProcess(Process):
     def __init__(self, connection, hypothesis_id, input_queue, chunk_size=5000, done_event=None,
                  log_handler=null_log_handler, glycan_offset=None,
-                 glycan_limit=_DEFAULT_GLYCAN_STEP_LIMIT):
+                 glycan_limit=_DEFAULT_GLYCAN_STEP_LIMIT, glycan_combination_partitions=None):
         Process.__init__(self)
         self.daemon = True
         self.connection = connection
@@ -408,6 +479,7 @@ class PeptideGlycosylatingProcess(Process):
 
         self.glycan_offset = glycan_offset
         self.glycan_limit = glycan_limit
+        self.glycan_combination_partitions = glycan_combination_partitions
 
         self.session = None
         self.work_done_event = Event()
@@ -416,7 +488,7 @@ class PeptideGlycosylatingProcess(Process):
         return self.work_done_event.is_set()
 
     def process_result(self, collection):
-        self.session.bulk_save_objects(collection)
+        insert_glycopeptides(self.session, collection)
         self.session.commit()
 
     def load_peptides(self, work_items):
@@ -431,7 +503,8 @@ class PeptideGlycosylatingProcess(Process):
         glycosylator = PeptideGlycosylator(
             database.session, self.hypothesis_id,
             glycan_offset=self.glycan_offset,
-            glycan_limit=self.glycan_limit)
+            glycan_limit=self.glycan_limit,
+            glycan_combination_partitions=self.glycan_combination_partitions)
         result_accumulator = []
 
         n = 0
@@ -459,6 +532,8 @@ class PeptideGlycosylatingProcess(Process):
                 n_gps += len(result_accumulator)
                 self.process_result(result_accumulator)
                 result_accumulator = []
+            # The batch's peptides are finished with, don't let them pile up in the session
+            self.session.expunge_all()
         self.work_done_event.set()
         # It seems there is no public API to force the process to check if it is done
         # but the internal method is invoked when creating a Process `repr` on Python 2.
@@ -484,14 +559,18 @@ class NonSavingPeptideGlycosylatingProcess(PeptideGlycosylatingProcess):
 class QueuePushingPeptideGlycosylatingProcess(PeptideGlycosylatingProcess):
     def __init__(self, connection, hypothesis_id, input_queue, output_queue, chunk_size=5000,
                  done_event=None, log_handler=null_log_handler, database_mutex=None,
-                 glycan_offset=None, glycan_limit=_DEFAULT_GLYCAN_STEP_LIMIT):
+                 glycan_offset=None, glycan_limit=_DEFAULT_GLYCAN_STEP_LIMIT,
+                 glycan_combination_partitions=None):
         super(QueuePushingPeptideGlycosylatingProcess, self).__init__(
             connection, hypothesis_id, input_queue, chunk_size, done_event, log_handler,
-            glycan_offset=glycan_offset, glycan_limit=glycan_limit)
+            glycan_offset=glycan_offset, glycan_limit=glycan_limit,
+            glycan_combination_partitions=glycan_combination_partitions)
         self.output_queue = output_queue
         self.database_mutex = database_mutex
 
     def load_peptides(self, work_items):
+        if self.database_mutex is None:
+            return super(QueuePushingPeptideGlycosylatingProcess, self).load_peptides(work_items)
         with self.database_mutex:
             result = super(QueuePushingPeptideGlycosylatingProcess, self).load_peptides(work_items)
         return result
@@ -499,10 +578,18 @@ class QueuePushingPeptideGlycosylatingProcess(PeptideGlycosylatingProcess):
     def process_result(self, collection):
         self.output_queue.put(collection)
 
+    def run(self):
+        try:
+            super(QueuePushingPeptideGlycosylatingProcess, self).run()
+        finally:
+            # Tell the writer that this worker will send no more glycopeptides
+            self.output_queue.put(None)
+
 
 class MultipleProcessPeptideGlycosylator(TaskBase):
     def __init__(self, connection_specification, hypothesis_id, chunk_size=6500, n_processes=4,
-                 glycan_combination_count=None, glycan_limit=_DEFAULT_GLYCAN_STEP_LIMIT):
+                 glycan_combination_count=None, glycan_limit=_DEFAULT_GLYCAN_STEP_LIMIT,
+                 use_write_ahead_log=False):
         self.n_processes = n_processes
         self.connection_specification = connection_specification
         self.chunk_size = chunk_size
@@ -512,49 +599,151 @@ class MultipleProcessPeptideGlycosylator(TaskBase):
         self.glycan_limit = glycan_limit
 
         self.input_queue = Queue(10)
-        self.output_queue = Queue(1000)
+        self.output_queue = self._make_output_queue()
         self.workers = []
         self.dealt_done_event = Event()
         self.ipc_controller = self.ipc_logger()
         self.database_mutex = RLock()
+        self.use_database_mutex = True
+        self.use_write_ahead_log = use_write_ahead_log
+
+    def build_glycan_combination_partitions(self, session):
+        glycosylator = PeptideGlycosylator(
+            session, self.hypothesis_id,
+            glycan_offset=self.current_glycan_offset,
+            glycan_limit=self.glycan_limit)
+        return glycosylator.glycan_combination_partitions
 
-    def spawn_worker(self):
+    def spawn_worker(self, glycan_combination_partitions=None):
         worker = QueuePushingPeptideGlycosylatingProcess(
             self.connection_specification, self.hypothesis_id, self.input_queue,
             self.output_queue, self.chunk_size, self.dealt_done_event,
-            self.ipc_controller.sender(), self.database_mutex,
+            self.ipc_controller.sender(),
+            self.database_mutex if self.use_database_mutex else None,
             glycan_offset=self.current_glycan_offset,
-            glycan_limit=self.glycan_limit)
+            glycan_limit=self.glycan_limit,
+            glycan_combination_partitions=glycan_combination_partitions)
         return worker
 
-    def push_work_batches(self, peptide_ids):
+    def work_batch_size(self, n, glycan_combination_partitions=None):
+        """Choose how many peptides to deal to a worker at a time.
+
+        The number of glycopeptides a peptide produces depends on how many glycan
+        combinations can occupy its sites, so batches are sized to produce about one
+        worker output chunk each, assuming one site per peptide. They are also kept
+        small enough that every worker receives several batches.
+        """
+        fanout = 1
+        if glycan_combination_partitions is not None:
+            fanout = sum(
+                len(glycan_combination_partitions[1, {glycan_type: 1}])
+                for glycan_type in (GlycanTypes.n_glycan, GlycanTypes.o_glycan,
+                                    GlycanTypes.gag_linker))
+            fanout = max(fanout, 1)
+        chunk_size = max(50, min(2000, self.chunk_size // fanout))
+        chunk_size = min(chunk_size, n // (self.n_processes * 4))
+        return max(chunk_size, 1)
+
+    def push_work_batches(self, peptide_ids, glycan_combination_partitions=None):
         n = len(peptide_ids)
         i = 0
-        chunk_size = min(int(n * 0.05), 1000)
+        chunk_size = self.work_batch_size(n, glycan_combination_partitions)
+        last = 0
+        interval = max(int(n * 0.05), 1)
         while i < n:
             self.input_queue.put(peptide_ids[i:(i + chunk_size)])
             i += chunk_size
-            self.log("... Dealt Peptides %d-%d %0.2f%%" % (i - chunk_size, min(i, n), (min(i, n) / float(n)) * 100))
+            if i - last >= interval or i >= n:
+                self.log("... Dealt Peptides %d-%d %0.2f%%" % (
+                    last, min(i, n), (min(i, n) / float(n)) * 100))
+                last = i
         self.log("... All Peptides Dealt")
         self.dealt_done_event.set()
 
+    def _make_output_queue(self):
+        if FasterFifoQueue is not None:
+            return FasterFifoQueue(max_size_bytes=_OUTPUT_QUEUE_SIZE_BYTES)
+        return Queue(1000)
+
+    def get_output_batches(self, timeout=5, max_batches=16):
+        """Wait up to `timeout` seconds for a batch of glycopeptides from the workers,
+        then take up to `max_batches` batches which are already waiting. A worker sends
+        :const:`None` in place of a batch when it exits.
+
+        When :mod:`faster_fifo` is available this is a single :meth:`get_many` call
+        which acquires the queue's lock once, otherwise the waiting batches are drained
+        one at a time.
+
+        Raises
+        ------
+        QueueEmptyException:
+            If no batch arrives within `timeout` seconds
+        """
+        if FasterFifoQueue is not None:
+            return self.output_queue.get_many(
+                timeout=timeout, max_messages_to_get=max_batches)
+        batches = [self.output_queue.get(True, timeout)]
+        try:
+            while len(batches) < max_batches:
+                batches.append(self.output_queue.get_nowait())
+        except QueueEmptyException:
+            pass
+        return batches
+
+    def _journal_mode(self, session):
+        return str(session.execute("PRAGMA journal_mode").scalar()).lower()
+
+    def _set_journal_mode(self, session, mode):
+        return str(session.execute("PRAGMA journal_mode=%s" % (mode,)).scalar()).lower()
+
+    def _readers_block_on_writer(self, session):
+        """Determine whether workers reading peptides must wait for the writer.
+
+        Only SQLite with a rollback journal locks readers out while a transaction is
+        committing. Other databases, and SQLite in write-ahead-log mode, let readers
+        proceed alongside the writer. This only inspects the journal mode.
+        """
+        if session.bind.dialect.name != 'sqlite':
+            return False
+        return self._journal_mode(session) != 'wal'
+
+    def _enter_write_ahead_log(self, session):
+        """Switch an SQLite database to write-ahead-log mode if requested.
+
+        Returns
+        -------
+        str or None
+            The journal mode to restore afterwards, or :const:`None` if nothing
+            was changed
+        """
+        if not self.use_write_ahead_log or session.bind.dialect.name != 'sqlite':
+            return None
+        previous_journal_mode = self._journal_mode(session)
+        if previous_journal_mode == 'wal':
+            return None
+        self._set_journal_mode(session, 'wal')
+        return previous_journal_mode
+
     def create_barrier(self):
-        self.database_mutex.__enter__()
+        if self.use_database_mutex:
+            self.database_mutex.__enter__()
 
     def teardown_barrier(self):
-        self.database_mutex.__exit__(None, None, None)
+        if self.use_database_mutex:
+            self.database_mutex.__exit__(None, None, None)
 
-    def create_queue_feeder_thread(self, peptide_ids):
-        queue_feeder = Thread(target=self.push_work_batches, args=(peptide_ids,))
+    def create_queue_feeder_thread(self, peptide_ids, glycan_combination_partitions=None):
+        queue_feeder = Thread(
+            target=self.push_work_batches, args=(peptide_ids, glycan_combination_partitions))
         queue_feeder.daemon = True
         queue_feeder.start()
         return queue_feeder
 
-    def spawn_all_workers(self):
+    def spawn_all_workers(self, glycan_combination_partitions=None):
         self.workers = []
 
         for i in range(self.n_processes):
-            worker = self.spawn_worker()
+            worker = self.spawn_worker(glycan_combination_partitions)
             worker.start()
             self.workers.append(worker)
 
@@ -562,47 +751,49 @@ class MultipleProcessPeptideGlycosylator(TaskBase):
         connection = DatabaseBoundOperation(self.connection_specification)
         session = connection.session
 
-        self.log("Begin Creation. Dropping Indices")
-        index_controller = toggle_indices(session, Glycopeptide)
-        index_controller.drop()
-
-        while self.current_glycan_offset < self.glycan_combination_count:
-            _current_progress = float(self.current_glycan_offset + self.glycan_limit)
-            _current_percent_complete = _current_progress / self.glycan_combination_count * 100.0
-            _current_percent_complete = min(_current_percent_complete, 100.0)
-            self.log("... Processing Glycan Combinations %d-%d (%0.2f%%)" % (
-                self.current_glycan_offset, min(self.current_glycan_offset + self.glycan_limit,
-                                                self.glycan_combination_count),
-                _current_percent_complete))
-            queue_feeder = self.create_queue_feeder_thread(peptide_ids)
-            self.spawn_all_workers()
-
-            has_work = True
-            last = 0
-            i = 0
-            while has_work:
-                try:
-                    batch = self.output_queue.get(True, 5)
+        previous_journal_mode = self._enter_write_ahead_log(session)
+        self.use_database_mutex = self._readers_block_on_writer(session)
+        try:
+            self.log("Begin Creation. Dropping Indices")
+            index_controller = toggle_indices(session, Glycopeptide)
+            index_controller.drop()
+
+            while self.current_glycan_offset < self.glycan_combination_count:
+                _current_progress = float(self.current_glycan_offset + self.glycan_limit)
+                _current_percent_complete = _current_progress / self.glycan_combination_count * 100.0
+                _current_percent_complete = min(_current_percent_complete, 100.0)
+                self.log("... Processing Glycan Combinations %d-%d (%0.2f%%)" % (
+                    self.current_glycan_offset, min(self.current_glycan_offset + self.glycan_limit,
+                                                    self.glycan_combination_count),
+                    _current_percent_complete))
+                # Partition this block of glycan combinations once here rather than
+                # once in every worker process.
+                glycan_combination_partitions = self.build_glycan_combination_partitions(session)
+                queue_feeder = self.create_queue_feeder_thread(peptide_ids, glycan_combination_partitions)
+                self.spawn_all_workers(glycan_combination_partitions)
+
+                n_running = len(self.workers)
+                last = 0
+                i = 0
+                while n_running > 0:
                     try:
-                        waiting_batches = self.output_queue.qsize()
-                        if waiting_batches > 10:
-                            self.create_barrier()
-                            self.log("... %d waiting sets." % (waiting_batches,))
-                            try:
-                                for _ in range(waiting_batches):
-                                    batch.extend(self.output_queue.get_nowait())
-                            except QueueEmptyException:
-                                pass
-                            self.teardown_barrier()
-                    except NotImplementedError:
-                        # platform does not support qsize()
-                        pass
+                        batches = self.get_output_batches(5)
+                    except QueueEmptyException:
+                        continue
+                    batch = []
+                    for rows in batches:
+                        if rows is None:
+                            n_running -= 1
+                        else:
+                            batch.extend(rows)
+                    if not batch:
+                        continue
                     i += len(batch)
 
                     self.create_barrier()
 
                     try:
-                        session.bulk_save_objects(batch)
+                        insert_glycopeptides(session, batch)
                         session.commit()
                     except Exception:
                         session.rollback()
@@ -613,17 +804,17 @@ class MultipleProcessPeptideGlycosylator(TaskBase):
                     if (i - last) > self.chunk_size * 20:
                         self.log("... %d Glycopeptides Created" % (i,))
                         last = i
-                except QueueEmptyException:
-                    if all(w.is_work_done() for w in self.workers):
-                        has_work = False
-                    continue
-            queue_feeder.join()
-            self.ipc_controller.stop()
-            for worker in self.workers:
-                self.log("Joining Process %r (%s)" % (worker.pid, worker.is_alive()))
-                worker.join()
-
-            self.current_glycan_offset += self.glycan_limit
-
-        self.log("All Work Done. Rebuilding Indices")
-        index_controller.create()
+                queue_feeder.join()
+                self.ipc_controller.stop()
+                for worker in self.workers:
+                    self.log("Joining Process %r (%s)" % (worker.pid, worker.is_alive()))
+                    worker.join()
+
+                self.current_glycan_offset += self.glycan_limit
+
+            self.log("All Work Done. Rebuilding Indices")
+            index_controller.create()
+        finally:
+            if previous_journal_mode is not None:
+                session.commit()
+                self._set_journal_mode(session, previous_journal_mode)
@@ -3,8 +3,8 @@ from multiprocessing import Queue, Event
 from glycan_profiling.serialize.hypothesis.peptide import Peptide, Protein
 
 from .common import (
-    GlycopeptideHypothesisSerializerBase, PeptideGlycosylator,
-    PeptideGlycosylatingProcess, MultipleProcessPeptideGlycosylator)
+    GlycopeptideHypothesisSerializerBase, PeptideGlycosylator, iterslurp,
+    insert_glycopeptides, PeptideGlycosylatingProcess, MultipleProcessPeptideGlycosylator)
 from .proteomics import mzid_proteome
 
 
@@ -68,16 +68,16 @@ class MzIdentMLGlycopeptideHypothesisSerializer(GlycopeptideHypothesisSerializer
         glycosylator = PeptideGlycosylator(self.session, self.hypothesis_id)
         acc = []
         i = 0
-        for peptide_id in self.peptide_ids():
-            peptide = self.query(Peptide).get(peptide_id)
+        for peptide in iterslurp(self.session, Peptide, self.peptide_ids()):
             for glycopeptide in glycosylator.handle_peptide(peptide):
                 acc.append(glycopeptide)
                 i += 1
                 if len(acc) > 100000:
-                    self.session.bulk_save_objects(acc)
+                    insert_glycopeptides(self.session, acc)
                     self.session.commit()
                     acc = []
-        self.session.bulk_save_objects(acc)
+            self.session.expunge(peptide)
+        insert_glycopeptides(self.session, acc)
         self.session.commit()
 
     def run(self):
@@ -102,15 +102,17 @@ class MultipleProcessMzIdentMLGlycopeptideHypothesisSerializer(MzIdentMLGlycopep
 
     def __init__(self, mzid_path, connection, glycan_hypothesis_id, hypothesis_name=None,
                  target_proteins=None, max_glycosylation_events=1, reference_fasta=None,
-                 n_processes=4):
+                 n_processes=4, use_write_ahead_log=False):
         super(MultipleProcessMzIdentMLGlycopeptideHypothesisSerializer, self).__init__(
             mzid_path, connection, glycan_hypothesis_id, hypothesis_name, target_proteins,
             max_glycosylation_events, reference_fasta)
         self.n_processes = n_processes
+        self.use_write_ahead_log = use_write_ahead_log
 
     def glycosylate_peptides(self):
         dispatcher = MultipleProcessPeptideGlycosylator(
             self._original_connection, self.hypothesis_id,
             glycan_combination_count=self.total_glycan_combination_count,
-            n_processes=self.n_processes)
+            n_processes=self.n_processes,
+            use_write_ahead_log=self.use_write_ahead_log)
         dispatcher.process(self.peptide_ids())
@@ -14,7 +14,7 @@ from .proteomics.remove_duplicate_peptides import DeduplicatePeptides
 
 from .proteomics.fasta import ProteinFastaFileParser
 from .common import (
-    GlycopeptideHypothesisSerializerBase,
+    GlycopeptideHypothesisSerializerBase, iterpages, insert_glycopeptides,
     PeptideGlycosylator, PeptideGlycosylatingProcess,
     NonSavingPeptideGlycosylatingProcess,
     MultipleProcessPeptideGlycosylator)
@@ -66,13 +66,12 @@ class FastaGlycopeptideHypothesisSerializer(GlycopeptideHypothesisSerializerBase
             self.max_missed_cleavages)
         i = 0
         j = 0
-        protein_ids = self.protein_ids()
-        n = len(protein_ids)
+        proteins = self.query(Protein).filter(Protein.hypothesis_id == self.hypothesis_id)
+        n = proteins.count()
         interval = min(n / 10., 100000)
         acc = []
-        for protein_id in protein_ids:
+        for protein in iterpages(proteins, Protein):
             i += 1
-            protein = self.query(Protein).get(protein_id)
             if i % interval == 0:
                 self.log("%0.3f%% Complete (%d/%d). %d Peptides Produced." % (i * 100. / n, i, n, j))
             for peptide in digestor.process_protein(protein):
@@ -82,6 +81,7 @@ class FastaGlycopeptideHypothesisSerializer(GlycopeptideHypothesisSerializerBase
                     self.session.bulk_save_objects(acc)
                     self.session.commit()
                     acc = []
+            self.session.expunge(protein)
         self.session.bulk_save_objects(acc)
         self.session.commit()
         acc = []
@@ -92,13 +92,12 @@ class FastaGlycopeptideHypothesisSerializer(GlycopeptideHypothesisSerializerBase
             self.constant_modifications, self.variable_modifications)
         i = 0
         j = 0
-        protein_ids = self.protein_ids()
-        n = len(protein_ids)
+        proteins = self.query(Protein).filter(Protein.hypothesis_id == self.hypothesis_id)
+        n = proteins.count()
         interval = min(n / 10., 100000)
         acc = []
-        for protein_id in protein_ids:
+        for protein in iterpages(proteins, Protein):
             i += 1
-            protein = self.query(Protein).get(protein_id)
             if i % interval == 0:
                 self.log("%0.3f%% Complete (%d/%d). %d Peptides Produced." % (i * 100. / n, i, n, j))
             for peptide in splitter.handle_protein(protein):
@@ -108,6 +107,7 @@ class FastaGlycopeptideHypothesisSerializer(GlycopeptideHypothesisSerializerBase
                     self.session.bulk_save_objects(acc)
                     self.session.commit()
                     acc = []
+            self.session.expunge(protein)
         self.session.bulk_save_objects(acc)
         self.session.commit()
         acc = []
@@ -117,16 +117,17 @@ class FastaGlycopeptideHypothesisSerializer(GlycopeptideHypothesisSerializerBase
         glycosylator = PeptideGlycosylator(self.session, self.hypothesis_id)
         acc = []
         i = 0
-        for peptide_id in self.peptide_ids():
-            peptide = self.query(Peptide).get(peptide_id)
+        peptides = self.query(Peptide).filter(Peptide.hypothesis_id == self.hypothesis_id)
+        for peptide in iterpages(peptides, Peptide):
             for glycopeptide in glycosylator.handle_peptide(peptide):
                 acc.append(glycopeptide)
                 i += 1
                 if len(acc) > 100000:
-                    self.session.bulk_save_objects(acc)
+                    insert_glycopeptides(self.session, acc)
                     self.session.commit()
                     acc = []
-        self.session.bulk_save_objects(acc)
+            self.session.expunge(peptide)
+        insert_glycopeptides(self.session, acc)
         self.session.commit()
 
     def run(self):
@@ -147,12 +148,14 @@ class FastaGlycopeptideHypothesisSerializer(GlycopeptideHypothesisSerializerBase
 class MultipleProcessFastaGlycopeptideHypothesisSerializer(FastaGlycopeptideHypothesisSerializer):
     def __init__(self, fasta_file, connection, glycan_hypothesis_id, hypothesis_name=None,
                  protease='trypsin', constant_modifications=None, variable_modifications=None,
-                 max_missed_cleavages=2, max_glycosylation_events=1, n_processes=4):
+                 max_missed_cleavages=2, max_glycosylation_events=1, n_processes=4,
+                 use_write_ahead_log=False):
         super(MultipleProcessFastaGlycopeptideHypothesisSerializer, self).__init__(
             fasta_file, connection, glycan_hypothesis_id, hypothesis_name,
             protease, constant_modifications, variable_modifications,
             max_missed_cleavages, max_glycosylation_events)
         self.n_processes = n_processes
+        self.use_write_ahead_log = use_write_ahead_log
 
     def digest_proteins(self):
         digestor = ProteinDigestor(
@@ -177,7 +180,8 @@ class MultipleProcessFastaGlycopeptideHypothesisSerializer(FastaGlycopeptideHypo
         dispatcher = MultipleProcessPeptideGlycosylator(
             self._original_connection, self.hypothesis_id,
             glycan_combination_count=self.total_glycan_combination_count,
-            n_processes=self.n_processes)
+            n_processes=self.n_processes,
+            use_write_ahead_log=self.use_write_ahead_log)
         dispatcher.process(self.peptide_ids())
 
 
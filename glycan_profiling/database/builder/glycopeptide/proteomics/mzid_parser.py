@@ -1,6 +1,7 @@
 import re
 import logging
-from lxml.etree import LxmlError
+from collections import OrderedDict
+from lxml.etree import LxmlError, Element, iterparse
 from pyteomics import mzid
 
 logger = logging.getLogger("mzid")
@@ -8,6 +9,27 @@ logger = logging.getLogger("mzid")
 MzIdentML = mzid.MzIdentML
 _local_name = mzid.xml._local_name
 peptide_evidence_ref = re.compile(r"(?P<evidence_id>PEPTIDEEVIDENCE_PEPTIDE_\d+_DBSEQUENCE_)(?P<parent_accession>.+)")
+_peptide_evidence_prefix = "PEPTIDEEVIDENCE_PEPTIDE_"
+
+CVPARAM_USERPARAM = frozenset({"cvParam", "userParam"})
+
+
+def _release_element(element):
+    """Free an element parsed by :func:`~lxml.etree.iterparse` along with
+    every element that was completed before it.
+
+    The element is cleared, and at each level up to the root, the siblings
+    preceding it are removed from their parent so the partial tree does not
+    grow with the document.
+    """
+    element.clear()
+    node = element
+    parent = node.getparent()
+    while parent is not None:
+        while node.getprevious() is not None:
+            del parent[0]
+        node = parent
+        parent = node.getparent()
 
 
 class MultipleProteinMatchesException(Exception):
@@ -61,7 +83,20 @@ class MissingPeptideEvidenceHandler(object):
 
 
 class Parser(MzIdentML):
-    def _handle_ref(self, info, key, value):
+    _ref_cache_size = 10000
+
+    def __init__(self, *args, **kwargs):
+        MzIdentML.__init__(self, *args, **kwargs)
+        self._element_converters = {}
+        self._ref_cache = OrderedDict()
+
+    def _resolve_ref(self, key, value):
+        try:
+            referenced = self._ref_cache.pop(value)
+            self._ref_cache[value] = referenced
+            return referenced
+        except KeyError:
+            pass
         try:
             referenced = self.get_by_id(value, retrieve_refs=True)
         except AttributeError:
@@ -69,6 +104,18 @@ class Parser(MzIdentML):
                 referenced = MissingPeptideEvidenceHandler.recover(value)
             else:
                 raise AttributeError(key)
+        # The same DBSequence and PeptideEvidence entries are referenced by
+        # many identifications. The cached value is only ever read from, as
+        # :meth:`_handle_ref` copies its entries into the referencing record.
+        # The least recently used entries are evicted so that the cache does not
+        # grow with the size of the document.
+        if len(self._ref_cache) >= self._ref_cache_size:
+            self._ref_cache.popitem(last=False)
+        self._ref_cache[value] = referenced
+        return referenced
+
+    def _handle_ref(self, info, key, value):
+        referenced = self._resolve_ref(key, value)
         info.update(referenced)
         del info[key]
         info.pop('id', None)
@@ -77,11 +124,18 @@ class Parser(MzIdentML):
         multi = None
         for k, v in dict(info).items():
             if k.endswith('_ref'):
-                is_multi_db_sequence = peptide_evidence_ref.match(info[k])
-                if is_multi_db_sequence and ':' in is_multi_db_sequence.groupdict()['parent_accession']:
-                    groups = is_multi_db_sequence.groupdict()
-                    evidence_id = groups['evidence_id']
-                    db_sequences = groups['parent_accession'].split(':')
+                ref = info[k]
+                # Most references are not peptide evidence, so avoid running the
+                # regular expression unless the prefix could match.
+                is_multi_db_sequence = None
+                parent_accession = ''
+                if ref.startswith(_peptide_evidence_prefix):
+                    is_multi_db_sequence = peptide_evidence_ref.match(ref)
+                    if is_multi_db_sequence is not None:
+                        parent_accession = is_multi_db_sequence.group('parent_accession')
+                if ':' in parent_accession:
+                    evidence_id = is_multi_db_sequence.group('evidence_id')
+                    db_sequences = parent_accession.split(':')
                     if len(db_sequences) > 1:
                         multi = MultipleProteinMatchesException(
                             "", evidence_id, db_sequences, k)
@@ -94,6 +148,38 @@ class Parser(MzIdentML):
         info.multi = multi
         return info, multi
 
+    def iterstream(self, name, **kwargs):
+        """Stream every element with local name `name` from the document,
+        like :meth:`iterfind`, but without retaining the parsed tree.
+
+        Only the end of each matching element is observed, and it and everything
+        parsed before it are released as soon as it has been converted, so memory
+        use does not grow with the size of the document. The whole document is
+        read from its start regardless of the current file position, which is
+        restored once iteration stops.
+
+        Parameters
+        ----------
+        name : str
+            The local name of the element to stream
+        **kwargs
+            Passed to :meth:`_get_info_smart`
+
+        Yields
+        ------
+        dict
+        """
+        position = self.tell()
+        self.seek(0)
+        try:
+            for _, element in iterparse(self, events=('end',), tag='{*}' + name,
+                                        remove_comments=True, huge_tree=self._huge_tree):
+                info = self._get_info_smart(element, **kwargs)
+                _release_element(element)
+                yield info
+        finally:
+            self.seek(position)
+
     def _find_by_id_reset(self, *a, **kw):
         return MzIdentML._find_by_id_reset(self, *a, **kw)
 
@@ -107,29 +193,45 @@ class Parser(MzIdentML):
             info['name'].append(newinfo.pop('name'))
 
     def _find_immediate_params(self, element, **kwargs):
-        return element.xpath('./*[local-name()="{}" or local-name()="{}"]'.format("cvParam", "userParam"))
+        return [child for child in element.iterchildren(Element)
+                if _local_name(child) in CVPARAM_USERPARAM]
 
     def _recursive_populate(self, element, info, kwargs):
+        lists = self.schema_info['lists']
+        insert_param = self._insert_param
+        get_info_smart = self._get_info_smart
         for child in element.iterchildren():
             cname = _local_name(child)
-            if cname in ('cvParam', 'userParam'):
-                self._insert_param(info, child, **kwargs)
+            if cname in CVPARAM_USERPARAM:
+                insert_param(info, child, **kwargs)
             else:
-                if cname not in self.schema_info['lists']:
-                    info[cname] = self._get_info_smart(child, **kwargs)
+                if cname not in lists:
+                    info[cname] = get_info_smart(child, **kwargs)
                 else:
                     info.setdefault(cname, []).append(
-                        self._get_info_smart(child, **kwargs))
+                        get_info_smart(child, **kwargs))
+
+    def _converters_for(self, name):
+        try:
+            return self._element_converters[name]
+        except KeyError:
+            schema_info = self.schema_info
+            element_converters = {}
+            for t, a in self._converters.items():
+                for element_name, k in schema_info.get(t, ()):
+                    if element_name == name:
+                        element_converters[k] = a
+            self._element_converters[name] = element_converters
+            return element_converters
 
     def _convert_values(self, element, info, kwargs):
-        converters = self._converters
+        converters = self._converters_for(_local_name(element))
+        if not converters:
+            return
         for k, v in info.items():
-            try:
-                for t, a in converters.items():
-                    if (_local_name(element), k) in self.schema_info[t]:
-                        info[k] = a(v)
-            except KeyError:
-                continue
+            a = converters.get(k)
+            if a is not None:
+                info[k] = a(v)
 
     def _populate_references(self, element, info, kwargs):
         info = MultipleProteinInfoDict(info)
@@ -161,7 +263,7 @@ class Parser(MzIdentML):
         """Extract info from element's attributes, possibly recursive.
         <cvParam> and <userParam> elements are treated in a special way."""
         name = _local_name(element)
-        if name in {'cvParam', 'userParam'}:
+        if name in CVPARAM_USERPARAM:
             return self._handle_param(element)
 
         info = dict(element.attrib)
@@ -186,9 +288,10 @@ class Parser(MzIdentML):
         infos = self._populate_references(element, info, kwargs)
 
         # flatten the excessive nesting
+        structures_to_flatten = self._structures_to_flatten
         for info in infos:
             for k, v in dict(info).items():
-                if k in self._structures_to_flatten:
+                if k in structures_to_flatten:
                     info.update(v)
                     del info[k]
 
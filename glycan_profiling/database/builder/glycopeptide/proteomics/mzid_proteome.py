@@ -92,7 +92,7 @@ def protein_names(mzid_path, pattern=r'.*'):
     pattern = re.compile(pattern)
     parser = Parser(mzid_path, retrieve_refs=False,
                     iterative=True, build_id_cache=False, use_index=False)
-    for protein in parser.iterfind(
+    for protein in parser.iterstream(
             "DBSequence", retrieve_refs=False, recursive=False, iterative=True):
         name = protein['accession']
         if pattern.match(name):
@@ -722,7 +722,7 @@ class Proteome(DatabaseBoundOperation, MzIdentMLProteomeExtraction):
         session = self.session
         protein_map = {}
         self.parser.reset()
-        for protein in self.parser.iterfind(
+        for protein in self.parser.iterstream(
                 "DBSequence", retrieve_refs=True, recursive=True, iterative=True):
             # check = protein.copy()
             seq = protein.pop('Seq', None)
@@ -779,7 +779,7 @@ class Proteome(DatabaseBoundOperation, MzIdentMLProteomeExtraction):
             self.modification_translation_table,
             protein_filter=protein_filter)
 
-        for spectrum_identification in self.parser.iterfind(
+        for spectrum_identification in self.parser.iterstream(
                 "SpectrumIdentificationItem", retrieve_refs=True, iterative=True):
             peptide_converter.handle_peptide_dict(spectrum_identification)
             i += 1
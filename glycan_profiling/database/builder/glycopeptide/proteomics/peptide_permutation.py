@@ -1,6 +1,12 @@
 from collections import defaultdict
 import itertools
-from multiprocessing import Process, Queue, Event
+from multiprocessing import Process, Queue, Event, RLock
+from threading import Thread
+
+try:
+    from Queue import Empty as QueueEmptyException
+except ImportError:
+    from queue import Empty as QueueEmptyException
 
 from lxml.etree import XMLSyntaxError
 
@@ -330,10 +336,28 @@ class ProteinDigestor(TaskBase):
 digest = ProteinDigestor.digest_protein
 
 
+_peptide_columns = [column.key for column in Peptide.__table__.columns if not column.primary_key]
+
+
+def peptide_to_row(peptide):
+    """Convert a transient :class:`~.Peptide` into a column-value mapping which can
+    be passed between processes and written with a Core ``INSERT``.
+    """
+    return {key: getattr(peptide, key) for key in _peptide_columns}
+
+
+def insert_peptides(session, peptides):
+    """Write column-value mappings for :class:`~.Peptide` with a single
+    executemany ``INSERT``.
+    """
+    if peptides:
+        session.execute(Peptide.__table__.insert(), peptides)
+
+
 class ProteinDigestingProcess(Process):
 
     def __init__(self, connection, hypothesis_id, input_queue, digestor, done_event=None,
-                 chunk_size=5000, message_handler=None):
+                 chunk_size=5000, message_handler=None, output_queue=None, database_mutex=None):
         Process.__init__(self)
         self.connection = connection
         self.input_queue = input_queue
@@ -342,6 +366,23 @@ class ProteinDigestingProcess(Process):
         self.digestor = digestor
         self.chunk_size = chunk_size
         self.message_handler = message_handler
+        self.output_queue = output_queue
+        self.database_mutex = database_mutex
+
+    def load_proteins(self, session, work_items):
+        if self.database_mutex is None:
+            return slurp(session, Protein, work_items, flatten=False)
+        with self.database_mutex:
+            return slurp(session, Protein, work_items, flatten=False)
+
+    def save_peptides(self, session, peptides):
+        if not peptides:
+            return
+        if self.output_queue is None:
+            session.bulk_save_objects(peptides)
+            session.commit()
+        else:
+            self.output_queue.put([peptide_to_row(peptide) for peptide in peptides])
 
     def task(self):
         database = DatabaseBoundOperation(self.connection)
@@ -362,7 +403,7 @@ class ProteinDigestingProcess(Process):
                 if self.done_event.is_set():
                     has_work = False
                 continue
-            proteins = slurp(session, Protein, work_items, flatten=False)
+            proteins = self.load_proteins(session, work_items)
             acc = []
 
             threshold_size = 3000
@@ -376,8 +417,7 @@ class ProteinDigestingProcess(Process):
                     acc.append(peptide)
                     i += 1
                     if len(acc) > self.chunk_size:
-                        session.bulk_save_objects(acc)
-                        session.commit()
+                        self.save_peptides(session, acc)
                         acc = []
                     if i % 10000 == 0:
                         self.message_handler(
@@ -385,19 +425,27 @@ class ProteinDigestingProcess(Process):
                                 i, protein.name, size))
                 if size > threshold_size:
                     self.message_handler("Finished digesting %s (%d)" % (protein.name, size))
-            session.bulk_save_objects(acc)
-            session.commit()
-            acc = []
-        if acc:
-            session.bulk_save_objects(acc)
-            session.commit()
+            self.save_peptides(session, acc)
             acc = []
+        self.save_peptides(session, acc)
+        acc = []
 
     def run(self):
-        self.task()
+        try:
+            self.task()
+        finally:
+            if self.output_queue is not None:
+                # Signal the writer that this worker will send no more peptides.
+                self.output_queue.put(None)
 
 
 class MultipleProcessProteinDigestor(TaskBase):
+    """Digest proteins in parallel worker processes.
+
+    Workers send the peptides they produce back to this process, which is the only
+    one writing to the database, and so does not compete with the workers for the
+    database's write lock.
+    """
     def __init__(self, connection, hypothesis_id, protein_ids, digestor, n_processes=4):
         self.connection = connection
         self.hypothesis_id = hypothesis_id
@@ -405,40 +453,81 @@ class MultipleProcessProteinDigestor(TaskBase):
         self.digestor = digestor
         self.n_processes = n_processes
 
-    def run(self):
-        logger = self.ipc_logger()
-        input_queue = Queue(20 * self.n_processes)
-        done_event = Event()
-        processes = [
-            ProteinDigestingProcess(
-                self.connection, self.hypothesis_id, input_queue,
-                self.digestor, done_event=done_event,
-                message_handler=logger.sender()) for i in range(
-                self.n_processes)
-        ]
-        protein_ids = self.protein_ids
+        self.input_queue = None
+        self.output_queue = None
+        self.done_event = None
+        self.database_mutex = None
+
+    def push_work_batches(self, protein_ids):
         i = 0
         n = len(protein_ids)
         chunk_size = 2
         interval = 30
-        for process in processes:
-            input_queue.put(protein_ids[i:(i + chunk_size)])
-            i += chunk_size
-            process.start()
-
         last = i
         while i < n:
-            input_queue.put(protein_ids[i:(i + chunk_size)])
+            self.input_queue.put(protein_ids[i:(i + chunk_size)])
             i += chunk_size
             if i - last > interval:
                 self.log("... Dealt Proteins %d-%d %0.2f%%" % (
                     i - chunk_size, min(i, n), (min(i, n) / float(n)) * 100))
                 last = i
+        self.done_event.set()
 
-        done_event.set()
+    def create_queue_feeder_thread(self, protein_ids):
+        queue_feeder = Thread(target=self.push_work_batches, args=(protein_ids,))
+        queue_feeder.daemon = True
+        queue_feeder.start()
+        return queue_feeder
+
+    def run(self):
+        logger = self.ipc_logger()
+        # Each run uses its own queues and event, so the digestor can be run again
+        self.input_queue = Queue(20 * self.n_processes)
+        self.output_queue = Queue(1000)
+        self.done_event = Event()
+        self.database_mutex = RLock()
+        processes = [
+            ProteinDigestingProcess(
+                self.connection, self.hypothesis_id, self.input_queue,
+                self.digestor, done_event=self.done_event,
+                message_handler=logger.sender(), output_queue=self.output_queue,
+                database_mutex=self.database_mutex) for i in range(
+                self.n_processes)
+        ]
         for process in processes:
-            process.join()
-        logger.stop()
+            process.start()
+        queue_feeder = self.create_queue_feeder_thread(self.protein_ids)
+
+        session = DatabaseBoundOperation(self.connection).session
+        completed = False
+        try:
+            n_running = len(processes)
+            while n_running > 0:
+                try:
+                    batch = self.output_queue.get(True, 5)
+                except QueueEmptyException:
+                    continue
+                if batch is None:
+                    n_running -= 1
+                    continue
+                with self.database_mutex:
+                    try:
+                        insert_peptides(session, batch)
+                        session.commit()
+                    except Exception:
+                        session.rollback()
+                        raise
+            queue_feeder.join()
+            completed = True
+        finally:
+            if not completed:
+                # The workers would otherwise block forever on the full output
+                # queue, keeping this process from exiting.
+                for process in processes:
+                    process.terminate()
+            for process in processes:
+                process.join()
+            logger.stop()
 
 
 class ProteinSplitter(TaskBase):
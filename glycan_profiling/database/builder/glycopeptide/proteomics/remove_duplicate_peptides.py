@@ -1,7 +1,9 @@
+from sqlalchemy import and_, or_
+
 from glycan_profiling.serialize.utils import temp_table
 from glycan_profiling.serialize import (
     Peptide, Protein, DatabaseBoundOperation,
-    TemplateNumberStore)
+    TemplateNumberStore, func)
 
 from glycan_profiling.task import log_handle, TaskBase
 
@@ -14,44 +16,101 @@ class DeduplicatePeptides(DatabaseBoundOperation, TaskBase):
     def run(self):
         self.remove_duplicates()
 
+    def best_peptides_query(self):
+        """Build a query for the id of the highest scoring peptide for each
+        distinct modified sequence, protein and start position in the hypothesis.
+
+        Ties, including groups where no peptide is scored, are broken in favor of
+        the lowest id. Peptides whose sequence or start position is unknown form
+        their own group rather than being matched against nothing.
+
+        Returns
+        -------
+        sqlalchemy.orm.Query
+        """
+        group_key = (Peptide.modified_peptide_sequence, Peptide.protein_id, Peptide.start_position)
+        best_scores = self.session.query(
+            *(group_key + (func.max(Peptide.peptide_score).label("best_score"),))).join(
+            Protein).filter(Protein.hypothesis_id == self.hypothesis_id).group_by(
+            *group_key).subquery()
+        q = self.session.query(func.min(Peptide.id)).join(best_scores, and_(
+            Peptide.modified_peptide_sequence.isnot_distinct_from(
+                best_scores.c.modified_peptide_sequence),
+            Peptide.protein_id == best_scores.c.protein_id,
+            Peptide.start_position.isnot_distinct_from(best_scores.c.start_position),
+            or_(Peptide.peptide_score == best_scores.c.best_score,
+                best_scores.c.best_score.is_(None)))).group_by(*group_key)
+        return q
+
     def find_best_peptides(self):
-        q = self.session.query(
-            Peptide.id, Peptide.peptide_score,
-            Peptide.modified_peptide_sequence, Peptide.protein_id, Peptide.start_position).join(
-            Protein).filter(Protein.hypothesis_id == self.hypothesis_id).yield_per(10000)
-        keepers = dict()
-        for id, score, modified_peptide_sequence, protein_id, start_position in q:
-            try:
-                old_id, old_score = keepers[modified_peptide_sequence, protein_id, start_position]
-                if score > old_score:
-                    keepers[modified_peptide_sequence, protein_id, start_position] = id, score
-            except KeyError:
-                keepers[modified_peptide_sequence, protein_id, start_position] = id, score
+        conn = self.session.connection()
+        dialect = conn.dialect
+        compiled = self.best_peptides_query().statement.compile(dialect=dialect)
+        if dialect.positional:
+            params = tuple(compiled.params[key] for key in compiled.positiontup)
+        else:
+            params = compiled.params
+        # The result is a single integer column, so read it straight from the
+        # DB-API cursor rather than paying for SQLAlchemy's row processing.
+        cursor = conn.connection.cursor()
+        keepers = []
+        try:
+            cursor.execute(str(compiled), params)
+            batch = cursor.fetchmany(10000)
+            while batch:
+                keepers.extend(peptide_id for peptide_id, in batch)
+                batch = cursor.fetchmany(10000)
+        finally:
+            cursor.close()
         return keepers
 
     def store_best_peptides(self, keepers):
         table = temp_table(TemplateNumberStore)
         conn = self.session.connection()
         table.create(conn)
-        payload = [{"value": x[0]} for x in keepers.values()]
-        conn.execute(table.insert(), payload)
+        dialect = conn.dialect
+        # Load the ids through the DB-API cursor directly, skipping the
+        # per-row parameter processing of SQLAlchemy's executemany.
+        if keepers:
+            statement = str(table.insert().compile(dialect=dialect))
+            if dialect.positional:
+                payload = [(x,) for x in keepers]
+            else:
+                payload = [{"value": x} for x in keepers]
+            cursor = conn.connection.cursor()
+            try:
+                cursor.executemany(statement, payload)
+            finally:
+                cursor.close()
         self.session.commit()
         return table
 
     def remove_duplicates(self):
-        self.log("... Extracting Best Peptides")
+        self.log("... Removing Duplicates")
+        if self.session.bind.dialect.name == 'mysql':
+            # MySQL refuses to DELETE from a table that the WHERE clause's
+            # subquery also reads from, so the keepers must be staged first.
+            self.remove_duplicates_via_temp_table()
+        else:
+            keepers = self.best_peptides_query()
+            protein_ids = self.session.query(Protein.id).filter(
+                Protein.hypothesis_id == self.hypothesis_id)
+            peptide_table = Peptide.__table__
+            self.session.execute(peptide_table.delete().where(and_(
+                peptide_table.c.protein_id.in_(protein_ids.correlate(None)),
+                ~peptide_table.c.id.in_(keepers.correlate(None)))))
+        self.log("... Complete")
+        self.session.commit()
+
+    def remove_duplicates_via_temp_table(self):
         keepers = self.find_best_peptides()
         table = self.store_best_peptides(keepers)
         ids = self.session.query(table.c.value)
-        self.log("... Building Mask")
         q = self.session.query(Peptide.id).filter(
             Peptide.protein_id == Protein.id,
             Protein.hypothesis_id == self.hypothesis_id,
             ~Peptide.id.in_(ids.correlate(None)))
-        self.log("... Removing Duplicates")
         self.session.execute(Peptide.__table__.delete(
             Peptide.__table__.c.id.in_(q.selectable)))
         conn = self.session.connection()
         table.drop(conn)
-        self.log("... Complete")
-        self.session.commit()
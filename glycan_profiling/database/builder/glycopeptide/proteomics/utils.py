@@ -1,9 +1,13 @@
-def slurp(session, model, ids, flatten=True):
+def slurp(session, model, ids, flatten=True, step=900):
+    """Load the instances of `model` whose ids are in `ids`, issuing one ``IN``
+    query per `step` ids.
+
+    `step` is kept under SQLite's default limit of 999 bound parameters.
+    """
     if flatten:
         ids = [j for i in ids for j in i]
     total = len(ids)
     last = 0
-    step = 100
     results = []
     while last < total:
         results.extend(session.query(model).filter(
@@ -189,6 +189,7 @@ class CompositionSpace(object):
 
 class CompositionGraphNode(object):
     _temp_score = 0.0
+    _serialized = None
 
     def __init__(self, composition, index, score=0., **kwargs):
         self.composition = composition
@@ -221,6 +222,17 @@ class CompositionGraphNode(object):
     def edge_to(self, node):
         return self.edges.edge_to(self, node)
 
+    def serialize(self):
+        """The serialized form of :attr:`composition`, computed once and cached
+
+        Returns
+        -------
+        str
+        """
+        if self._serialized is None:
+            self._serialized = self.composition.serialize()
+        return self._serialized
+
     def __eq__(self, other):
         try:
             return (self)._str == str(other)
@@ -1,6 +1,8 @@
 import os
 from collections import defaultdict, OrderedDict
 
+from six import string_types as basestring
+
 from glycan_profiling import task, serialize, version
 
 from glypy.composition import formula
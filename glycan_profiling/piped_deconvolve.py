@@ -19,6 +19,9 @@ from glycan_profiling.task import (
     TaskBase,
     log_handle,
     CallInterval)
+# Importing this module registers glycan_profiling's own scan filters, which
+# workers started by spawn or forkserver would otherwise not know by name
+from glycan_profiling import scan_filter
 
 
 from multiprocessing import Process, Queue
@@ -39,7 +42,46 @@ savgol = ms_peak_picker.scan_filter.SavitskyGolayFilter()
 denoise = ms_peak_picker.scan_filter.FTICRBaselineRemoval(window_length=2.)
 
 
+class ScorerSpecification(object):
+    """Describes an isotopic pattern scorer from :mod:`ms_deisotope.scoring`
+    by name and constructor arguments so that it can be sent to worker
+    processes cheaply and instantiated there.
+
+    Attributes
+    ----------
+    name : str
+        The name of the scorer type in :mod:`ms_deisotope.scoring`
+    args : tuple
+        The arguments to pass to the scorer type
+    """
+    def __init__(self, name, *args):
+        self.name = name
+        self.args = args
+
+    def build(self):
+        return getattr(ms_deisotope.scoring, self.name)(*self.args)
+
+    def __repr__(self):
+        return repr(self.build())
+
+
+def build_deconvolution_args(deconvolution_args):
+    """Instantiate the scorer of `deconvolution_args` if it was given as a
+    :class:`ScorerSpecification`, returning a new dictionary.
+    """
+    if deconvolution_args is None:
+        return None
+    scorer = deconvolution_args.get("scorer")
+    if isinstance(scorer, ScorerSpecification):
+        deconvolution_args = dict(deconvolution_args)
+        deconvolution_args["scorer"] = scorer.build()
+    return deconvolution_args
+
+
 class ScanIDYieldingProcess(Process):
+    # The approximate cost of processing a precursor scan relative to
+    # processing a single product scan
+    precursor_scan_weight = 10
 
     def __init__(self, mzml_path, queue, start_scan=None, max_scans=None, end_scan=None,
                  no_more_event=None, ignore_tandem_scans=False, batch_size=1):
@@ -58,16 +100,27 @@ class ScanIDYieldingProcess(Process):
         self.no_more_event = no_more_event
 
     def _make_scan_batch(self):
+        """Collect scan bunches until their estimated cost reaches that of
+        :attr:`batch_size` precursor scans.
+
+        A precursor scan costs :attr:`precursor_scan_weight` units and each
+        product scan to be processed costs one, so bunches with many product
+        scans fill a batch sooner and workers receive similar amounts of work.
+        """
         batch = []
         scan_ids = []
-        for i in range(self.batch_size):
+        weight = 0
+        budget = self.batch_size * self.precursor_scan_weight
+        while weight < budget:
             try:
                 scan, products = next(self.loader)
             except Exception:
                 break
             scan_id = scan.id
+            weight += self.precursor_scan_weight
             if not self.ignore_tandem_scans:
                 batch.append((scan_id, [p.id for p in products], True))
+                weight += len(products)
             else:
                 batch.append((scan_id, [p.id for p in products], False))
             scan_ids.append(scan_id)
@@ -201,6 +254,9 @@ class ScanTransformingProcess(Process, ScanTransformMixin):
     output_queue : multiprocessing.Queue
         A shared output queue which this object will put
         :class:`ms_deisotope.data_source.common.ProcessedScan` bunches onto.
+    pick_only_tandem_envelopes : bool
+        Whether to pick MS1 peaks only within the m/z windows selected for
+        MS/MS instead of across each whole MS1 scan
     """
 
     def __init__(self, mzml_path, input_queue, output_queue,
@@ -208,7 +264,7 @@ class ScanTransformingProcess(Process, ScanTransformMixin):
                  msn_peak_picking_args=None,
                  ms1_deconvolution_args=None, msn_deconvolution_args=None,
                  envelope_selector=None, ms1_averaging=0, log_handler=None,
-                 deconvolute=True):
+                 deconvolute=True, pick_only_tandem_envelopes=False):
         if log_handler is None:
             def print_message(msg):
                 print(msg)
@@ -248,6 +304,7 @@ class ScanTransformingProcess(Process, ScanTransformMixin):
         self.ms1_deconvolution_args = ms1_deconvolution_args
         self.msn_deconvolution_args = msn_deconvolution_args
         self.envelope_selector = envelope_selector
+        self.pick_only_tandem_envelopes = pick_only_tandem_envelopes
         self.ms1_averaging = ms1_averaging
         self.deconvolute = deconvolute
 
@@ -260,10 +317,11 @@ class ScanTransformingProcess(Process, ScanTransformMixin):
             loader,
             ms1_peak_picking_args=self.ms1_peak_picking_args,
             msn_peak_picking_args=self.msn_peak_picking_args,
-            ms1_deconvolution_args=self.ms1_deconvolution_args,
-            msn_deconvolution_args=self.msn_deconvolution_args,
+            ms1_deconvolution_args=build_deconvolution_args(self.ms1_deconvolution_args),
+            msn_deconvolution_args=build_deconvolution_args(self.msn_deconvolution_args),
             loader_type=lambda x: x,
             envelope_selector=self.envelope_selector,
+            pick_only_tandem_envelopes=self.pick_only_tandem_envelopes,
             ms1_averaging=self.ms1_averaging)
         return transformer
 
@@ -662,7 +720,7 @@ class ScanGenerator(TaskBase, ScanGeneratorBase):
                  ms1_peak_picking_args=None, msn_peak_picking_args=None,
                  ms1_deconvolution_args=None, msn_deconvolution_args=None,
                  extract_only_tandem_envelopes=False, ignore_tandem_scans=False,
-                 ms1_averaging=0, deconvolute=True):
+                 ms1_averaging=0, deconvolute=True, scan_batch_size=1):
         self.ms_file = ms_file
         self.time_cache = {}
         self.ignore_tandem_scans = ignore_tandem_scans
@@ -680,6 +738,7 @@ class ScanGenerator(TaskBase, ScanGeneratorBase):
         self._order_manager = None
 
         self.number_of_helpers = number_of_helpers
+        self.scan_batch_size = scan_batch_size
 
         self.ms1_peak_picking_args = ms1_peak_picking_args
         self.msn_peak_picking_args = msn_peak_picking_args
@@ -750,7 +809,8 @@ class ScanGenerator(TaskBase, ScanGeneratorBase):
             envelope_selector=self._scan_interval_tree,
             log_handler=self.log_controller.sender(),
             ms1_averaging=self.ms1_averaging,
-            deconvolute=self.deconvoluting)
+            deconvolute=self.deconvoluting,
+            pick_only_tandem_envelopes=self.extract_only_tandem_envelopes)
 
     def _make_collator(self):
         return ScanCollator(
@@ -777,7 +837,7 @@ class ScanGenerator(TaskBase, ScanGeneratorBase):
         self._scan_yielder_process = ScanIDYieldingProcess(
             self.ms_file, self._input_queue, start_scan=start_scan, end_scan=end_scan,
             max_scans=max_scans, no_more_event=self.scan_ids_exhausted_event,
-            ignore_tandem_scans=self.ignore_tandem_scans, batch_size=1)
+            ignore_tandem_scans=self.ignore_tandem_scans, batch_size=self.scan_batch_size)
         self._scan_yielder_process.start()
 
         self._deconv_process = self._make_transforming_process()
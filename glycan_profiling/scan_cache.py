@@ -1,10 +1,13 @@
 import os
+import struct
 import tempfile
 
 import threading
 
 import logging
 
+import numpy as np
+
 try:
     from Queue import Queue, Empty as QueueEmptyException
 except ImportError:
@@ -421,6 +424,136 @@ class ThreadedMzMLScanCacheHandler(MzMLScanCacheHandler):
         super(ThreadedMzMLScanCacheHandler, self).complete()
 
 
+class BinaryScanCacheHandler(ScanCacheHandlerBase):
+    """Writes processed scans to an append-only binary file, one record per
+    scan in the order they are received, followed by a table of record offsets
+    at the end of the file so that the number of scans need not be known in
+    advance.
+
+    Each record holds the scan's index, time, MS level and id followed by
+    parallel arrays of peak mass, intensity, charge and score. Deconvoluted
+    scans store neutral masses, while centroided scans store m/z with a charge
+    and score of zero.
+    """
+    magic = b"GRBSCAN1"
+    record_header = struct.Struct("<QdiI")
+    id_length = struct.Struct("<H")
+    offset_type = struct.Struct("<Q")
+
+    def __init__(self, path, sample_name):
+        super(BinaryScanCacheHandler, self).__init__()
+        self.path = path
+        self.sample_name = sample_name
+        self.handle = open(path, 'wb')
+        self.offsets = []
+        self.handle.write(self.magic)
+        self._write_string(sample_name)
+
+    @classmethod
+    def configure_storage(cls, path=None, name=None, source=None):
+        if path is None:
+            path = "processed.bin"
+        if name is None:
+            name = os.path.basename(path)
+        return cls(path, name)
+
+    def _write_string(self, value):
+        value = value.encode('utf8')
+        self.handle.write(self.id_length.pack(len(value)))
+        self.handle.write(value)
+
+    def _peak_arrays(self, scan):
+        peaks = scan.deconvoluted_peak_set
+        n = len(peaks) if peaks is not None else 0
+        if peaks is not None:
+            mass = np.fromiter((p.neutral_mass for p in peaks), dtype=np.float64, count=n)
+            charge = np.fromiter((p.charge for p in peaks), dtype=np.int32, count=n)
+            score = np.fromiter((p.score for p in peaks), dtype=np.float64, count=n)
+        else:
+            peaks = scan.peak_set if scan.peak_set is not None else []
+            n = len(peaks)
+            mass = np.fromiter((p.mz for p in peaks), dtype=np.float64, count=n)
+            charge = np.zeros(n, dtype=np.int32)
+            score = np.zeros(n, dtype=np.float64)
+        intensity = np.fromiter((p.intensity for p in peaks), dtype=np.float64, count=n)
+        return mass, intensity, charge, score
+
+    def _write_scan(self, scan):
+        self.offsets.append(self.handle.tell())
+        arrays = self._peak_arrays(scan)
+        self.handle.write(self.record_header.pack(
+            scan.index, scan.scan_time, scan.ms_level, len(arrays[0])))
+        self._write_string(scan.id)
+        for array in arrays:
+            self.handle.write(array.tobytes())
+
+    def save_bunch(self, precursor, products):
+        for scan in [precursor] + list(products):
+            self._write_scan(scan)
+            try:
+                scan.clear()
+            except AttributeError:
+                pass
+
+    def complete(self):
+        self.save()
+        table_offset = self.handle.tell()
+        self.handle.write(np.array(self.offsets, dtype='<u8').tobytes())
+        self.handle.write(self.offset_type.pack(table_offset))
+        self.handle.close()
+
+
+class BinaryScanCacheReader(object):
+    """Reads the records written by :class:`BinaryScanCacheHandler`, using the
+    offset table at the end of the file to access them in any order.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.handle = open(path, 'rb')
+        magic = self.handle.read(len(BinaryScanCacheHandler.magic))
+        if magic != BinaryScanCacheHandler.magic:
+            raise ValueError("%r is not a binary scan cache" % (path,))
+        self.sample_name = self._read_string()
+        offset_size = BinaryScanCacheHandler.offset_type.size
+        self.handle.seek(-offset_size, os.SEEK_END)
+        end = self.handle.tell()
+        table_offset, = BinaryScanCacheHandler.offset_type.unpack(self.handle.read(offset_size))
+        self.handle.seek(table_offset)
+        self.offsets = np.frombuffer(
+            self.handle.read(end - table_offset), dtype='<u8')
+
+    def _read_string(self):
+        length, = BinaryScanCacheHandler.id_length.unpack(
+            self.handle.read(BinaryScanCacheHandler.id_length.size))
+        return self.handle.read(length).decode('utf8')
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, i):
+        """Read the `i`th record as a dictionary of its scan metadata and peak arrays"""
+        header = BinaryScanCacheHandler.record_header
+        self.handle.seek(int(self.offsets[i]))
+        index, scan_time, ms_level, n = header.unpack(self.handle.read(header.size))
+        scan_id = self._read_string()
+        mass = np.frombuffer(self.handle.read(n * 8), dtype=np.float64)
+        intensity = np.frombuffer(self.handle.read(n * 8), dtype=np.float64)
+        charge = np.frombuffer(self.handle.read(n * 4), dtype=np.int32)
+        score = np.frombuffer(self.handle.read(n * 8), dtype=np.float64)
+        return {
+            "id": scan_id, "index": index, "scan_time": scan_time,
+            "ms_level": ms_level, "mass": mass, "intensity": intensity,
+            "charge": charge, "score": score
+        }
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def close(self):
+        self.handle.close()
+
+
 class SampleRunDestroyer(DatabaseBoundOperation, TaskBase):
     def __init__(self, database_connection, sample_run_id):
         DatabaseBoundOperation.__init__(self, database_connection)
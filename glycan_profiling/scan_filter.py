@@ -0,0 +1,112 @@
+import numpy as np
+
+from scipy.ndimage import convolve1d, minimum_filter1d, maximum_filter1d
+from scipy.signal import savgol_coeffs
+
+from ms_peak_picker.scan_filter import FilterBase, filter_register
+
+
+class FastSavitskyGolayFilter(FilterBase):
+    """A Savitsky-Golay smoothing filter which computes its convolution
+    kernel once and applies it with a single vectorized convolution over
+    the intensity array.
+
+    Attributes
+    ----------
+    window_length : int
+        The number of points in the smoothing window. Must be odd.
+    polyorder : int
+        The order of the polynomial fit within each window
+    coefficients : np.ndarray
+        The precomputed convolution kernel
+    """
+    def __init__(self, window_length=5, polyorder=3):
+        self.window_length = window_length
+        self.polyorder = polyorder
+        self.coefficients = savgol_coeffs(window_length, polyorder)
+
+    def filter(self, mz_array, intensity_array):
+        if len(intensity_array) <= self.window_length:
+            return mz_array, intensity_array
+        intensity_array = np.ascontiguousarray(intensity_array, dtype=np.float64)
+        smoothed = convolve1d(intensity_array, self.coefficients, mode='nearest')
+        # Smoothing can overshoot around sharp peaks, but negative intensities
+        # are meaningless to the peak picker.
+        np.maximum(smoothed, 0, out=smoothed)
+        return mz_array, smoothed
+
+    def __repr__(self):
+        return "%s(%d, %d)" % (self.__class__.__name__, self.window_length, self.polyorder)
+
+
+class SNIPBaselineRemoval(FilterBase):
+    """Subtract a baseline estimated by Statistics-sensitive Non-linear
+    Iterative Peak-clipping (SNIP).
+
+    Each iteration replaces every point with the smaller of itself and the
+    mean of its neighbors `k` points away, for `k` from 1 up to
+    :attr:`max_half_window`. Each pass is a single vectorized operation over
+    the intensity array.
+
+    Attributes
+    ----------
+    max_half_window : int
+        The largest clipping distance, in points. Should be somewhat wider
+        than the widest peak to be preserved.
+    """
+    def __init__(self, max_half_window=40):
+        self.max_half_window = max_half_window
+
+    def estimate_baseline(self, intensity_array):
+        baseline = np.array(intensity_array, dtype=np.float64)
+        n = len(baseline)
+        for k in range(1, min(self.max_half_window, (n - 1) // 2) + 1):
+            clipped = 0.5 * (baseline[:-2 * k] + baseline[2 * k:])
+            np.minimum(baseline[k:-k], clipped, out=baseline[k:-k])
+        return baseline
+
+    def filter(self, mz_array, intensity_array):
+        intensity_array = np.asarray(intensity_array, dtype=np.float64)
+        corrected = intensity_array - self.estimate_baseline(intensity_array)
+        np.maximum(corrected, 0, out=corrected)
+        return mz_array, corrected
+
+    def __repr__(self):
+        return "%s(%d)" % (self.__class__.__name__, self.max_half_window)
+
+
+class TopHatBaselineRemoval(FilterBase):
+    """Subtract a baseline estimated by a morphological opening (a sliding
+    minimum followed by a sliding maximum) of the intensity array, leaving
+    its top-hat transform.
+
+    The sliding extrema are computed by :mod:`scipy.ndimage` in time linear
+    in the number of points, independent of the window width.
+
+    Attributes
+    ----------
+    window_length : int
+        The width of the structuring element, in points. Should be wider
+        than the widest peak to be preserved.
+    """
+    def __init__(self, window_length=101):
+        self.window_length = window_length
+
+    def estimate_baseline(self, intensity_array):
+        baseline = minimum_filter1d(intensity_array, self.window_length, mode='nearest')
+        return maximum_filter1d(baseline, self.window_length, mode='nearest')
+
+    def filter(self, mz_array, intensity_array):
+        intensity_array = np.asarray(intensity_array, dtype=np.float64)
+        if len(intensity_array) == 0:
+            return mz_array, intensity_array
+        corrected = intensity_array - self.estimate_baseline(intensity_array)
+        return mz_array, corrected
+
+    def __repr__(self):
+        return "%s(%d)" % (self.__class__.__name__, self.window_length)
+
+
+filter_register['fast_savitsky_golay'] = FastSavitskyGolayFilter()
+filter_register['snip_baseline'] = SNIPBaselineRemoval()
+filter_register['tophat_baseline'] = TopHatBaselineRemoval()
@@ -0,0 +1,45 @@
+import unittest
+
+from collections import namedtuple
+
+from glycan_profiling.chromatogram_tree import Chromatogram
+from glycan_profiling.chromatogram_tree.grouping import ChromatogramMerger
+
+
+Peak = namedtuple("Peak", ("neutral_mass", "intensity", "charge"))
+
+
+def make_chromatogram(neutral_mass, intensity, retention_times):
+    peaks = [[Peak(neutral_mass, intensity, 1)] for _ in retention_times]
+    scan_ids = ["scan=%d" % (rt * 100) for rt in retention_times]
+    return Chromatogram.from_parts(None, retention_times, scan_ids, peaks)
+
+
+class ChromatogramMergerTest(unittest.TestCase):
+    def test_merge_keeps_merged_chromatogram(self):
+        merger = ChromatogramMerger([
+            make_chromatogram(1000.0, 100., [1.0, 1.5, 2.0]),
+            make_chromatogram(2000.0, 100., [1.0, 1.5, 2.0]),
+        ])
+        incoming = make_chromatogram(1000.005, 500., [1.75, 2.5])
+        merger.handle_new_chromatogram(incoming)
+
+        self.assertEqual(len(merger), 2)
+        merged = merger[0]
+        # The incoming chromatogram's signal is kept rather than discarded
+        self.assertEqual(len(merged.nodes), 5)
+        self.assertAlmostEqual(merged.total_signal, 1300.)
+        # The merged chromatogram takes the mass of its most abundant peak
+        self.assertAlmostEqual(merged.neutral_mass, 1000.005)
+        self.assertEqual(merger._masses, [c.neutral_mass for c in merger])
+
+    def test_merge_requires_time_overlap(self):
+        merger = ChromatogramMerger([make_chromatogram(1000.0, 100., [1.0, 1.5, 2.0])])
+        incoming = make_chromatogram(1000.005, 500., [10.0, 10.5])
+        merger.handle_new_chromatogram(incoming)
+        self.assertEqual(len(merger), 2)
+        self.assertEqual(merger._masses, sorted(c.neutral_mass for c in merger))
+
+
+if __name__ == '__main__':
+    unittest.main()
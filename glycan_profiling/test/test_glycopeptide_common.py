@@ -0,0 +1,46 @@
+import unittest
+
+from glycan_profiling.database.builder.glycopeptide.common import (
+    GlycanCombinationPartitionTable, limiting_combinations)
+
+
+class GlycanCombinationPartitionTableTest(unittest.TestCase):
+    def make_table(self, glycan_classes):
+        # class_count_keys only depends upon the glycan classes, so skip
+        # building the table from a database
+        table = GlycanCombinationPartitionTable.__new__(GlycanCombinationPartitionTable)
+        table.glycan_classes = glycan_classes
+        return table
+
+    def test_class_count_keys(self):
+        table = self.make_table(["N-Glycan", "O-Glycan"])
+        # Two components which may each be N- or O-linked reach (1, 1) by two
+        # assignments, but it is only reported once
+        keys = table.class_count_keys([("N-Glycan", "O-Glycan"), ("N-Glycan", "O-Glycan")])
+        self.assertEqual(keys, [(0, 2), (1, 1), (2, 0)])
+        keys = table.class_count_keys([("N-Glycan",), ("N-Glycan", "O-Glycan")])
+        self.assertEqual(keys, [(1, 1), (2, 0)])
+
+    def test_class_count_keys_unknown_class(self):
+        table = self.make_table(["N-Glycan", "O-Glycan"])
+        # A class that is not being partitioned on contributes nothing to the count
+        keys = table.class_count_keys([("N-Glycan",), ("GAG linker",)])
+        self.assertEqual(keys, [(1, 0)])
+        # A component with no class cannot be assigned, so there are no keys
+        keys = table.class_count_keys([("N-Glycan",), ()])
+        self.assertEqual(keys, [])
+
+
+class LimitingCombinationsTest(unittest.TestCase):
+    def test_stops_at_limit(self):
+        combinations = list(limiting_combinations(range(10), 2, limit=5))
+        self.assertEqual(combinations, [(0, 1), (0, 2), (0, 3), (0, 4), (0, 5)])
+        self.assertEqual(len(list(limiting_combinations(range(30), 3))), 100)
+
+    def test_fewer_than_limit(self):
+        combinations = list(limiting_combinations(range(4), 3))
+        self.assertEqual(combinations, [(0, 1, 2), (0, 1, 3), (0, 2, 3), (1, 2, 3)])
+
+
+if __name__ == '__main__':
+    unittest.main()
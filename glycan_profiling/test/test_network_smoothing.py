@@ -0,0 +1,79 @@
+import unittest
+
+import numpy as np
+import glypy
+
+from glycan_profiling.database import composition_network
+from glycan_profiling.composition_distribution_model import (
+    LaplacianSmoothingModel, weighted_laplacian_matrix)
+from glycan_profiling.composition_distribution_model.graph import (
+    _reference_optimize_observed_scores)
+from glycan_profiling.composition_distribution_model.glycome_network_smoothing import (
+    _hat_diagonal_complements)
+
+
+compositions = [
+    glypy.glycan_composition.FrozenGlycanComposition(HexNAc=2, Hex=i) for i in range(3, 10)
+] + [
+    glypy.glycan_composition.FrozenGlycanComposition(HexNAc=4, Hex=5, NeuAc=2),
+    glypy.glycan_composition.FrozenGlycanComposition(HexNAc=3, Hex=5),
+]
+
+# Leave some of the Hex chain unobserved, and the sialylated composition,
+# which has no neighbors, observed
+scores = {
+    compositions[0]: 10.,
+    compositions[2]: 25.,
+    compositions[3]: 18.,
+    compositions[5]: 7.,
+    compositions[7]: 30.,
+    compositions[8]: 12.,
+}
+
+
+def make_network():
+    network = composition_network.CompositionGraph(compositions)
+    network.create_edges(1)
+    for composition, score in scores.items():
+        node = network[composition]
+        node.score = node.internal_score = score
+    return network
+
+
+class LambdaSweepTest(unittest.TestCase):
+    lambda_values = np.arange(0.01, 1., 0.05)
+
+    def test_hat_diagonal_complements(self):
+        network = make_network()
+        laplacian = weighted_laplacian_matrix(network)
+        identity = np.eye(laplacian.shape[0])
+        expected = np.array([
+            1 - np.diag(np.linalg.inv(identity + lambd * laplacian))
+            for lambd in self.lambda_values]).T
+
+        complements = _hat_diagonal_complements(np.linalg.eigh(laplacian), self.lambda_values)
+        np.testing.assert_allclose(complements, expected, atol=1e-10)
+        # A node with no neighbors is left unsmoothed, so its complement must
+        # be exactly zero rather than rounding noise
+        isolated = network[compositions[7]].index
+        self.assertTrue(np.all(complements[isolated] == 0))
+
+        indices = [0, 2, isolated]
+        complements = _hat_diagonal_complements(
+            np.linalg.eigh(laplacian), self.lambda_values, indices)
+        np.testing.assert_allclose(complements, expected[indices], atol=1e-10)
+
+    def test_optimize_observed_scores_over(self):
+        network = make_network()
+        model = LaplacianSmoothingModel(network, np.ones((len(network), 1)), 0.0001)
+        t0 = np.linspace(0, 1, len(model.S0))
+        updates = model.optimize_observed_scores_over(self.lambda_values, t0)
+        self.assertEqual(updates.shape, (len(self.lambda_values), len(model.S0)))
+        for lambd, update in zip(self.lambda_values, updates):
+            expected = _reference_optimize_observed_scores(
+                model.block_L, lambd, np.array(model.S0), t0)
+            np.testing.assert_allclose(update, expected, atol=1e-8)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+import tempfile
+
+from glycan_profiling.serialize import (
+    DatabaseBoundOperation, GlycanHypothesis, GlycopeptideHypothesis,
+    Protein, Peptide)
+from glycan_profiling.database.builder.glycopeptide.proteomics.remove_duplicate_peptides import (
+    DeduplicatePeptides)
+
+
+class DeduplicatePeptidesTest(unittest.TestCase):
+    def setup_database(self):
+        database_path = tempfile.mktemp() + '.db'
+        handle = DatabaseBoundOperation(database_path)
+        session = handle.session
+        glycan_hypothesis = GlycanHypothesis(name="glycans", uuid="glycans")
+        session.add(glycan_hypothesis)
+        session.flush()
+        hypothesis = GlycopeptideHypothesis(
+            name="peptides", uuid="peptides", glycan_hypothesis_id=glycan_hypothesis.id)
+        session.add(hypothesis)
+        session.flush()
+        protein = Protein(name="P1", protein_sequence="PEPNGTIDE", hypothesis_id=hypothesis.id)
+        session.add(protein)
+        session.flush()
+        return database_path, handle, hypothesis.id, protein.id
+
+    def add_peptide(self, session, protein_id, hypothesis_id, sequence, start, score):
+        peptide = Peptide(
+            protein_id=protein_id, hypothesis_id=hypothesis_id,
+            base_peptide_sequence=sequence, modified_peptide_sequence=sequence,
+            start_position=start, peptide_score=score)
+        session.add(peptide)
+        session.flush()
+        return peptide.id
+
+    def test_keeps_one_peptide_per_group(self):
+        database_path, handle, hypothesis_id, protein_id = self.setup_database()
+        session = handle.session
+        add = self.add_peptide
+        # The best score wins, and a tie goes to the first peptide inserted
+        add(session, protein_id, hypothesis_id, "PEPNGT", 0, 5.0)
+        best = add(session, protein_id, hypothesis_id, "PEPNGT", 0, 10.0)
+        add(session, protein_id, hypothesis_id, "PEPNGT", 0, 10.0)
+        # An unscored group keeps its first peptide
+        unscored = add(session, protein_id, hypothesis_id, "NGTIDE", 3, None)
+        add(session, protein_id, hypothesis_id, "NGTIDE", 3, None)
+        # An unknown start position still forms a group of its own
+        unknown_start = add(session, protein_id, hypothesis_id, "PEPNGTIDE", None, 1.0)
+        add(session, protein_id, hypothesis_id, "PEPNGTIDE", None, 1.0)
+        session.commit()
+
+        DeduplicatePeptides(database_path, hypothesis_id).run()
+
+        remaining = sorted(i for i, in handle.session.query(Peptide.id))
+        self.assertEqual(remaining, sorted([best, unscored, unknown_start]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import unittest
+import tempfile
+
+from collections import namedtuple
+
+import numpy as np
+
+from glycan_profiling.scan_cache import BinaryScanCacheHandler, BinaryScanCacheReader
+
+
+FittedPeak = namedtuple("FittedPeak", ("mz", "intensity"))
+DeconvolutedPeak = namedtuple("DeconvolutedPeak", ("neutral_mass", "intensity", "charge", "score"))
+Scan = namedtuple("Scan", ("id", "index", "scan_time", "ms_level", "peak_set", "deconvoluted_peak_set"))
+
+
+def make_scans():
+    return [
+        Scan("scan=1", 0, 1.5, 1, None, [
+            DeconvolutedPeak(1200.5, 1e5, 2, 30.5),
+            DeconvolutedPeak(1800.25, 5e4, -3, 12.),
+        ]),
+        Scan("scan=2", 1, 1.52, 2, [
+            FittedPeak(204.08, 300.),
+            FittedPeak(366.14, 150.),
+            FittedPeak(512.2, 75.),
+        ], None),
+        # A product scan in which nothing was found
+        Scan("scan=3", 2, 1.54, 2, [], None),
+        Scan("scan=4", 3, 1.6, 1, None, []),
+    ]
+
+
+class BinaryScanCacheTest(unittest.TestCase):
+    def write_scans(self, scans):
+        path = tempfile.mktemp() + '.bin'
+        handler = BinaryScanCacheHandler.configure_storage(path, "test-sample")
+        for scan in scans:
+            handler.accumulate(scan)
+        handler.complete()
+        return path
+
+    def test_round_trip(self):
+        scans = make_scans()
+        path = self.write_scans(scans)
+        reader = BinaryScanCacheReader(path)
+        try:
+            self.assertEqual(reader.sample_name, "test-sample")
+            self.assertEqual(len(reader), len(scans))
+            for scan, record in zip(scans, reader):
+                self.assertEqual(record['id'], scan.id)
+                self.assertEqual(record['index'], scan.index)
+                self.assertEqual(record['scan_time'], scan.scan_time)
+                self.assertEqual(record['ms_level'], scan.ms_level)
+                if scan.deconvoluted_peak_set is not None:
+                    peaks = scan.deconvoluted_peak_set
+                    self.assertEqual(record['mass'].tolist(), [p.neutral_mass for p in peaks])
+                    self.assertEqual(record['charge'].tolist(), [p.charge for p in peaks])
+                    self.assertEqual(record['score'].tolist(), [p.score for p in peaks])
+                else:
+                    # Centroided scans store m/z, with no charge or score
+                    peaks = scan.peak_set
+                    self.assertEqual(record['mass'].tolist(), [p.mz for p in peaks])
+                    self.assertTrue(np.all(record['charge'] == 0))
+                    self.assertTrue(np.all(record['score'] == 0))
+                self.assertEqual(record['intensity'].tolist(), [p.intensity for p in peaks])
+        finally:
+            reader.close()
+            os.remove(path)
+
+    def test_offset_table(self):
+        scans = make_scans()
+        path = self.write_scans(scans)
+        reader = BinaryScanCacheReader(path)
+        try:
+            # The first record starts right after the magic number and sample name
+            header_size = (
+                len(BinaryScanCacheHandler.magic) + BinaryScanCacheHandler.id_length.size +
+                len("test-sample"))
+            self.assertEqual(int(reader.offsets[0]), header_size)
+            self.assertTrue(np.all(np.diff(reader.offsets) > 0))
+            # Records can be read in any order
+            self.assertEqual(reader[2]['id'], "scan=3")
+            self.assertEqual(len(reader[2]['mass']), 0)
+            self.assertEqual(reader[0]['id'], "scan=1")
+            self.assertEqual(reader[3]['id'], "scan=4")
+        finally:
+            reader.close()
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
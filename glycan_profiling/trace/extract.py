@@ -57,15 +57,20 @@ class ChromatogramExtractor(TaskBase):
             chroma, min_points=self.min_points, delta_rt=self.delta_rt)
 
     def summary_chromatograms(self):
-        mapping = defaultdict(list)
+        # Reduce each scan's peaks as they are visited rather than first
+        # copying every peak intensity into per-scan lists
+        totals = defaultdict(float)
+        base_peaks = defaultdict(float)
         for scan_id, peak in self.annotated_peaks:
-            mapping[scan_id].append(peak.intensity)
+            intensity = peak.intensity
+            totals[scan_id] += intensity
+            if intensity > base_peaks[scan_id]:
+                base_peaks[scan_id] = intensity
         bpc = SimpleChromatogram(self)
         tic = SimpleChromatogram(self)
-        collection = sorted(mapping.items(), key=lambda b: self.scan_id_to_rt(b[0]))
-        for scan_id, intensities in collection:
-            bpc[scan_id] = max(intensities)
-            tic[scan_id] = sum(intensities)
+        for scan_id in sorted(totals, key=self.scan_id_to_rt):
+            bpc[scan_id] = base_peaks[scan_id]
+            tic[scan_id] = totals[scan_id]
         self.base_peak_chromatogram = bpc
         self.total_ion_chromatogram = tic
 
@@ -1,4 +1,10 @@
-from setuptools import setup, find_packages
+import os
+import traceback
+
+from setuptools import setup, find_packages, Extension
+from setuptools.command.build_ext import build_ext
+from distutils.errors import (CCompilerError, DistutilsExecError,
+                              DistutilsPlatformError)
 
 with open("glycan_profiling/version.py") as version_file:
     version = None
@@ -16,11 +22,73 @@ with open("requirements.txt") as requirements_file:
     requirements.extend(requirements_file.readlines())
 
 
+def profile_guided_optimization_flags():
+    # Set GLYCRESOFT_PGO=generate to build instrumented extensions, run a representative
+    # workload, then rebuild with GLYCRESOFT_PGO=use. See the `pgo` target in the makefile.
+    mode = os.environ.get("GLYCRESOFT_PGO", "").lower()
+    if mode == "generate":
+        print("Building C extensions with profile generation instrumentation")
+        return ["-O3", "-fprofile-generate"], ["-fprofile-generate"]
+    elif mode == "use":
+        print("Building C extensions using collected profile data")
+        return ["-O3", "-fprofile-use", "-fprofile-correction"], ["-fprofile-use"]
+    return [], []
+
+
+def make_extensions():
+    try:
+        import numpy
+        from Cython.Build import cythonize
+    except ImportError:
+        print("Cython or NumPy not available, not building C extensions")
+        return []
+    compile_args, link_args = profile_guided_optimization_flags()
+    extensions = cythonize([
+        Extension(name="glycan_profiling.chromatogram_tree._search",
+                  sources=["glycan_profiling/chromatogram_tree/_search.pyx"],
+                  include_dirs=[numpy.get_include()],
+                  extra_compile_args=compile_args,
+                  extra_link_args=link_args),
+        Extension(name="glycan_profiling.database.builder.glycopeptide._glycosylate",
+                  sources=["glycan_profiling/database/builder/glycopeptide/_glycosylate.pyx"],
+                  extra_compile_args=compile_args,
+                  extra_link_args=link_args),
+    ], compiler_directives={"language_level": 2, "embedsignature": True})
+    return extensions
+
+
+ext_errors = (CCompilerError, DistutilsExecError, DistutilsPlatformError, ValueError)
+
+
+class BuildFailed(Exception):
+    pass
+
+
+class ve_build_ext(build_ext):
+    # This class allows C extension building to fail.
+
+    def run(self):
+        try:
+            build_ext.run(self)
+        except DistutilsPlatformError:
+            traceback.print_exc()
+            raise BuildFailed()
+
+    def build_extension(self, ext):
+        try:
+            build_ext.build_extension(self, ext)
+        except ext_errors:
+            traceback.print_exc()
+            raise BuildFailed()
+
+
 def run_setup(include_cext=True):
     setup(
         name='glycan_profiling',
         version=version,
         packages=find_packages(),
+        ext_modules=make_extensions() if include_cext else None,
+        cmdclass={"build_ext": ve_build_ext},
         include_package_data=True,
         author=', '.join(["Joshua Klein"]),
         author_email=["jaklein@bu.edu"],
@@ -40,4 +108,18 @@ def run_setup(include_cext=True):
             'Topic :: Scientific/Engineering :: Bio-Informatics'])
 
 
-run_setup()
+try:
+    run_setup(True)
+except Exception as exc:
+    print(exc)
+    run_setup(False)
+
+    status_msgs = (
+        "WARNING: The C extension could not be compiled, " +
+        "speedups are not enabled.",
+        "Plain-Python build succeeded."
+    )
+    print('*' * 75)
+    for msg in status_msgs:
+        print(msg)
+    print('*' * 75)